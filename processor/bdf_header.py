@@ -0,0 +1,148 @@
+import os
+from datetime import datetime, timezone
+
+ANNOTATION_LABELS = ('BDF Annotations', 'EDF Annotations')
+
+FIXED_HEADER_SIZE = 256
+SIGNAL_HEADER_SIZE = 256
+
+# (field, width) of the per-signal header fields, each field is stored for every signal before the next field
+SIGNAL_HEADER_FIELDS = (
+    ('label',               16),
+    ('transducer',          80),
+    ('physical_dimension',  8),
+    ('physical_min',        8),
+    ('physical_max',        8),
+    ('digital_min',         8),
+    ('digital_max',         8),
+    ('prefilter',           80),
+    ('samples_per_record',  8),
+    ('reserved',            32),
+)
+
+class BDFSignalHeader:
+    def __init__(self, label, transducer, physical_dimension, physical_min, physical_max, digital_min, digital_max, prefilter, samples_per_record, reserved=''):
+        self.label              = label
+        self.transducer         = transducer
+        self.physical_dimension = physical_dimension
+        self.physical_min       = float(physical_min)
+        self.physical_max       = float(physical_max)
+        self.digital_min        = int(digital_min)
+        self.digital_max        = int(digital_max)
+        self.prefilter          = prefilter
+        self.samples_per_record = int(samples_per_record)
+
+    @property
+    def is_annotation(self):
+        return self.label in ANNOTATION_LABELS
+
+    @property
+    def scale_info(self):
+        return (self.digital_min, self.digital_max, self.physical_min, self.physical_max)
+
+class BDFHeader:
+    """
+    Header of a BDF (24-bit) or EDF (16-bit) file, parsed without reading any of the data records.
+
+    Attributes:
+        file_path (str): path to the BDF / EDF file
+        is_bdf (bool): whether samples are 24-bit (BDF) or 16-bit (EDF) values
+        start_datetime (datetime): start of the recording (UTC)
+        header_size (int): number of bytes before the first data record
+        num_records (int): number of (complete) data records, inferred from the file size
+            when not (yet) given in the header e.g. while the file is being recorded
+        record_duration (float): duration of a data record in seconds
+        signals (list[BDFSignalHeader]): headers of all signals, including annotation signals
+    """
+
+    def __init__(self, file_path, is_bdf, start_datetime, header_size, num_records, record_duration, signals):
+        self.file_path = file_path
+        self.is_bdf = is_bdf
+        self.start_datetime = start_datetime
+        self.header_size = header_size
+        self.num_records = num_records
+        self.record_duration = record_duration
+        self.signals = signals
+
+    @property
+    def bytes_per_sample(self):
+        return 3 if self.is_bdf else 2
+
+    @property
+    def record_size(self):
+        return sum(signal.samples_per_record for signal in self.signals) * self.bytes_per_sample
+
+    @property
+    def data_signals(self):
+        """
+        Returns the (index, header) of the signals holding sample data i.e. excluding annotation signals
+        """
+        return [(index, signal) for index, signal in enumerate(self.signals) if not signal.is_annotation]
+
+    @property
+    def duration(self):
+        return self.num_records * self.record_duration
+
+    def sampling_rate(self, signal):
+        return signal.samples_per_record / self.record_duration
+
+    def records_per_chunk(self, chunk_size):
+        """
+        Returns the number of data records of each chunk window: chunk_size samples of the highest sampling rate
+        rounded down to whole data records (at least one), so the chunk windows of all channels end on the same records
+        """
+        return max(1, chunk_size // max((signal.samples_per_record for _, signal in self.data_signals), default=1))
+
+    @staticmethod
+    def read(file_path):
+        with open(file_path, 'rb') as file:
+            fixed = file.read(FIXED_HEADER_SIZE)
+            assert len(fixed) == FIXED_HEADER_SIZE, f"{file_path} is too small to hold a BDF / EDF header"
+
+            num_signals = int(_field(fixed, 252, 256))
+            signal_header = file.read(num_signals * SIGNAL_HEADER_SIZE)
+            assert len(signal_header) == num_signals * SIGNAL_HEADER_SIZE, f"{file_path} has a truncated signal header"
+
+        is_bdf = fixed[0] == 0xFF
+
+        start_datetime = _parse_start_datetime(_field(fixed, 168, 176), _field(fixed, 176, 184))
+
+        fields = {}
+        offset = 0
+        for name, width in SIGNAL_HEADER_FIELDS:
+            fields[name] = [_field(signal_header, offset + i * width, offset + (i + 1) * width) for i in range(num_signals)]
+            offset += num_signals * width
+
+        signals = [
+            BDFSignalHeader(**{name: values[i] for name, values in fields.items()})
+            for i in range(num_signals)
+        ]
+
+        header = BDFHeader(
+            file_path = file_path,
+            is_bdf = is_bdf,
+            start_datetime = start_datetime,
+            header_size = int(_field(fixed, 184, 192)),
+            num_records = int(_field(fixed, 236, 244)),
+            record_duration = float(_field(fixed, 244, 252)),
+            signals = signals,
+        )
+
+        # the record count may not be set (-1) or not be up to date while the file is being recorded
+        complete_records = (os.path.getsize(file_path) - header.header_size) // header.record_size
+        if header.num_records < 0 or header.num_records > complete_records:
+            header.num_records = complete_records
+
+        return header
+
+def _field(header, start, end):
+    return header[start:end].decode('ascii', errors='replace').strip()
+
+def _parse_start_datetime(date, time):
+    day, month, year = (int(part) for part in date.split('.'))
+    hour, minute, second = (int(part) for part in time.split('.'))
+
+    # EDF specifies a two digit year, using 1985 as the clipping date
+    year += 1900 if year >= 85 else 2000
+
+    return datetime(year, month, day, hour, minute, second, tzinfo=timezone.utc)
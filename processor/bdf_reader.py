@@ -4,86 +4,296 @@ import logging
 
 log = logging.getLogger()
 
+class UniformTimestamps:
+    """
+    Timestamps (in seconds) of uniformly sampled data, computed on access rather than held in memory
+
+    Values are identical to: np.linspace(0, total / rate, total, endpoint=False)[first:first + count] + start
+    so a range of the samples (e.g. of a shard) has exactly the timestamps of the same samples of the whole recording
+    """
+    def __init__(self, start, rate, count, first=0, total=None):
+        if total is None:
+            total = first + count
+
+        self.start = start
+        self.rate = rate
+        self.count = count
+        self.first = first
+        self._step = (total / rate) / total if total > 0 else 0.0
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(f"timestamp index {index} out of range")
+
+        return float(self.first + index) * self._step + self.start
+
+class BDFRateGroup:
+    """
+    Channels of a BDF file sharing the same number of samples per data record (i.e. the same sampling rate)
+
+    Exposes the same interface as a reader (channels, timestamps, contiguous_chunks, get_chunk)
+    for the channels of the group, the sample data is decoded by the owning BDFElectricalSeriesReader
+
+    Attributes:
+        samples_per_record (int): number of samples of each channel in a data record
+        sampling_rate (float): Sampling rate (in Hz) of the group's channels
+        num_samples (int): Number of samples per-channel
+        first_sample (int): Index of the group's first sample within the whole recording
+        timestamps (UniformTimestamps): Timestamps of the group's samples
+        channels (list[TimeSeriesChannel]): list of the group's channels and their respective metadata
+        scale_info (list[tuple]): (digital_min, digital_max, physical_min, physical_max) of each of the group's channels
+    """
+    def __init__(self, reader, samples_per_record, signal_indices, channels, scale_info):
+        self.reader = reader
+        self.samples_per_record = samples_per_record
+        self.signal_indices = signal_indices
+        self.channels = channels
+        self.scale_info = scale_info
+
+        self.sampling_rate = samples_per_record / reader.header.record_duration
+        self.num_samples = reader.num_records * samples_per_record
+        self.first_sample = reader.first_record * samples_per_record
+        self.timestamps = UniformTimestamps(
+            reader.session_start_time_secs,
+            self.sampling_rate,
+            self.num_samples,
+            first=self.first_sample,
+            total=reader.header.num_records * samples_per_record
+        )
+
+        # EDFlib's conversion of digital to physical values: physical = gain * (offset + digital)
+        dmin, dmax, pmin, pmax = (np.array(values, dtype=np.float64) for values in zip(*scale_info))
+        self.gain = (pmax - pmin) / (dmax - dmin)
+        self.offset = pmax / self.gain - dmax
+
+        # decoded digital samples (channels x samples) starting at sample buffer_start
+        self.buffer = np.empty((len(signal_indices), 0), dtype=np.int32)
+        self.buffer_start = 0
+
+    @property
+    def buffer_end(self):
+        return self.buffer_start + self.buffer.shape[1]
+
+    def release(self, position):
+        self.reader.release(self, position)
+
+    def window_size(self, chunk_size):
+        """
+        Returns the number of samples of the group's chunk windows, which span whole data records (see BDFHeader.records_per_chunk)
+        """
+        return self.reader.header.records_per_chunk(chunk_size) * self.samples_per_record
+
+    def contiguous_chunks(self):
+        """
+        Returns a generator of the index ranges for contiguous segments in data.
+
+        BDF / EDF data records are contiguous, so the group's samples form a single segment.
+        """
+        if self.num_samples > 0:
+            yield 0, self.num_samples
+
+    def get_chunk(self, channel_index, start=None, end=None):
+        """
+        Returns a chunk of the physical sample values of the given channel (index within the group)
+        """
+        digital = self.get_digital_chunk(channel_index, start, end)
+        return self.gain[channel_index] * (self.offset[channel_index] + digital.astype(np.float64))
+
+    def get_digital_chunk(self, channel_index, start=None, end=None):
+        """
+        Returns a chunk of the channel's unscaled digital (integer) sample values.
+
+        The physical values returned by get_chunk are derived from these using the channel's scale_info.
+        """
+        if start is None:
+            start = 0
+        if end is None:
+            end = self.num_samples
+
+        return self.reader.read_group(self, start, end)[channel_index]
+
 class BDFElectricalSeriesReader:
     """
-    BDF Reader : Wraps PyEDFLib
+    BDF Reader : Decodes the data records of a BDF (24-bit) or EDF (16-bit) file
+
+    Channels are grouped by their number of samples per data record (rate groups), each
+    group having its own sampling rate, timestamps and chunk windows. The data records are
+    decoded in a single (forward) pass: the samples of all groups are decoded from each read of
+    the records and buffered per group until that group's window is requested.
+
+    Requesting windows in order of their end time keeps each group's buffer to about a single window,
+    and each read of the data records to the records of a single window.
+
+    The reader can be limited to a range of channels and / or data records (e.g. a shard of the file),
+    sample indices and timestamps are then relative to the first record of the range.
 
     Attributes:
-        num_samples(int): Number of samples per-channel
+        header (BDFHeader): parsed header of the file
+        first_record (int): First data record read
+        num_records (int): Number of data records read
         num_channels (int): Number of channels
-        sampling_rate (int): Sampling rate (in Hz) either given by the raw file or calculated from given timestamp values
-        timestamps (int): Timestamps (offset seconds from 0) either given by the raw file or calculated from given sampling rate
-        channels (list[TimeSeriesChannel]): list of channels and their respective metadata
+        channels (list[TimeSeriesChannel]): list of all channels and their respective metadata
+        rate_groups (list[BDFRateGroup]): channels grouped by sampling rate (highest rate first)
+        scale_info (list[tuple]): (digital_min, digital_max, physical_min, physical_max) of each channel
     """
-    def __init__(self, edf, session_start_time):
+    def __init__(self, header, session_start_time=None, channel_range=None, record_range=None):
 
-        self.edf = edf
+        self.header = header
+        if session_start_time is None:
+            session_start_time = header.start_datetime
         self.session_start_time_secs = session_start_time.timestamp()
-        self.num_channels = self.edf.signals_in_file
-        self.num_samples = self.edf.getNSamples()[0] #Assume same sample coun across all channels
-        self.sampling_rate = self.edf.getSampleFrequency(0) #Assume same frequency across all channels
 
-        self._timestamps = np.linspace(
-            0, self.num_samples / self.sampling_rate, self.num_samples, endpoint=False
-        ) + self.session_start_time_secs
+        first_record, last_record = record_range if record_range is not None else (0, header.num_records)
+        assert 0 <= first_record <= last_record <= header.num_records, "Record range exceeds the data records"
+        self.first_record = first_record
+        self.num_records = last_record - first_record
+        self.bytes_per_sample = header.bytes_per_sample
 
-        self._channels = None
+        data_signals = header.data_signals
+        first_channel, last_channel = channel_range if channel_range is not None else (0, len(data_signals))
+        # channel indices are those of the whole file, keeping chunk file names stable across channel ranges
+        data_signals = [(channel_index, data_signals[channel_index]) for channel_index in range(first_channel, min(last_channel, len(data_signals)))]
+        self.num_channels = len(data_signals)
 
-        self.scale_info = []
-        for ch in range(self.num_channels):
-            dmin = self.edf.getDigitalMinimum(ch)
-            dmax = self.edf.getDigitalMaximum(ch)
-            pmin = self.edf.getPhysicalMinimum(ch)
-            pmax = self.edf.getPhysicalMaximum(ch)
-            self.scale_info.append((dmin, dmax, pmin, pmax))
+        # byte offset of each signal within a data record
+        self._signal_offsets = np.concatenate(([0], np.cumsum([signal.samples_per_record for signal in header.signals])))[:-1] * self.bytes_per_sample
 
-    @property
-    def timestamps(self):
-        return self._timestamps
+        self.scale_info = [signal.scale_info for _, (_, signal) in data_signals]
 
-    @property
-    def channels(self):
-        if self._channels is None:
-            self._channels = list()
-            for ch in range(self.num_channels):
-                label = self.edf.getLabel(ch)
-                self._channels.append(
+        self._channels = list()
+        groups = {}
+        for channel_index, (signal_index, signal) in data_signals:
+            groups.setdefault(signal.samples_per_record, []).append((channel_index, signal_index, signal))
+
+        self.rate_groups = []
+        for samples_per_record in sorted(groups, reverse=True):
+            members = groups[samples_per_record]
+            group = BDFRateGroup(
+                self,
+                samples_per_record,
+                signal_indices = [signal_index for _, signal_index, _ in members],
+                channels = [],
+                scale_info = [signal.scale_info for _, _, signal in members],
+            )
+            for channel_index, _, signal in members:
+                group.channels.append(
                     TimeSeriesChannel(
-                        index=ch,
-                        name=label,
-                        rate=self.sampling_rate,
-                        start=self.timestamps[0] * 1e6,
-                        end=self.timestamps[-1] * 1e6,
+                        index=channel_index,
+                        name=signal.label,
+                        rate=group.sampling_rate,
+                        start=group.timestamps[0] * 1e6,
+                        end=group.timestamps[-1] * 1e6,
                         group=""
                     )
                 )
+            self.rate_groups.append(group)
+
+        if len(self.rate_groups) > 1:
+            log.info("channels grouped by sampling rate: " + ", ".join(f"{len(group.channels)} @ {group.sampling_rate}Hz" for group in self.rate_groups))
+
+        self._next_record = 0
+
+    @property
+    def buffer_bytes_per_sample(self):
+        """
+        Returns the memory (in bytes) held while decoding a chunk window, per sample of the window of the file's highest
+        sampling rate: the window's data records as read and their decoded samples, twice while appended to a buffer
+        """
+        samples_per_record = max(signal.samples_per_record for _, signal in self.header.data_signals)
+        decoded_bytes = sum(len(group.channels) * group.samples_per_record * group.buffer.itemsize for group in self.rate_groups)
+
+        return (self.header.record_size + 2 * decoded_bytes) / samples_per_record
+
+    @property
+    def channels(self):
+        if not self._channels:
+            self._channels = sorted((channel for group in self.rate_groups for channel in group.channels), key=lambda channel: channel.index)
         return self._channels
 
-    def contiguous_chunks(self):
+    def read_group(self, group, start, end):
         """
-        Returns a generator of the index ranges for contiguous segments in data.
+        Returns the digital sample values (channels x samples) of a rate group for the sample range [start, end)
+
+        Records are decoded forward from the last decoded record up to the end of the range (e.g. a chunk window),
+        filling the buffers of every group, a range before the group's buffer (e.g. when re-reading) is decoded directly from the file.
+        """
+        if start < group.buffer_start:
+            first_record = start // group.samples_per_record
+            last_record = -(-end // group.samples_per_record)
+            samples = self._decode_records(first_record, last_record - first_record, [group])[group]
+            offset = first_record * group.samples_per_record
+            return samples[:, start - offset:end - offset]
+
+        self.release(group, start)
 
-        An index range is of the form [start, end).
+        # skip records no group needs anymore e.g. windows completed by a previous run
+        self._next_record = max(self._next_record, min(other.buffer_start // other.samples_per_record for other in self.rate_groups))
 
-        Boundaries are identified as follows:
+        if group.buffer_end < end:
+            last_record = -(-end // group.samples_per_record)
+            assert last_record <= self.num_records, "Sample range exceeds the data records"
+            record_count = last_record - self._next_record
 
-            sampling_period = 1 / sampling_rate
+            for decoded_group, samples in self._decode_records(self._next_record, record_count, self.rate_groups).items():
+                block_start = self._next_record * decoded_group.samples_per_record
+                if block_start + samples.shape[1] <= decoded_group.buffer_start:
+                    continue
+                # a group's buffer is either contiguous with the block or empty, starting within the block
+                samples = samples[:, max(0, decoded_group.buffer_start - block_start):]
+                if decoded_group.buffer.shape[1] > 0:
+                    samples = np.concatenate((decoded_group.buffer, samples), axis=1)
+                decoded_group.buffer = samples
 
-            (timestamp_difference) > 2 * sampling_period
+            self._next_record = last_record
+
+        return group.buffer[:, start - group.buffer_start:end - group.buffer_start]
+
+    def release(self, group, position):
+        """
+        Releases the buffered samples of a rate group before the given sample position, which will no longer be requested
         """
-        gap_threshold = (1.0 / self.sampling_rate) * 2
+        if position <= group.buffer_start:
+            return
 
-        boundaries = np.concatenate(
-            ([0], (np.diff(self.timestamps) > gap_threshold).nonzero()[0] + 1, [len(self.timestamps)]))
+        drop = min(position, group.buffer_end) - group.buffer_start
+        group.buffer = group.buffer[:, drop:]
+        group.buffer_start = position
 
-        for i in np.arange(len(boundaries)-1):
-            yield boundaries[i], boundaries[i + 1]
+    def _decode_records(self, first_record, record_count, groups):
+        """
+        Reads the given data records once and decodes the digital sample values of the given rate groups
+        """
+        record_size = self.header.record_size
+        with open(self.header.file_path, 'rb') as file:
+            file.seek(self.header.header_size + (self.first_record + first_record) * record_size)
+            data = file.read(record_count * record_size)
 
-    def get_chunk(self, channel_index, start=None, end=None):
-        if start is None:
-            start = 0
-        if end is None:
-            end = self.num_samples
+        assert len(data) == record_count * record_size, "Data records are truncated"
+
+        records = np.frombuffer(data, dtype=np.uint8).reshape(record_count, record_size)
+
+        decoded = {}
+        for group in groups:
+            width = group.samples_per_record * self.bytes_per_sample
+            samples = np.empty((len(group.signal_indices), record_count * group.samples_per_record), dtype=np.int32)
+            for position, signal_index in enumerate(group.signal_indices):
+                offset = self._signal_offsets[signal_index]
+                samples[position] = self._decode_samples(records[:, offset:offset + width])
+            decoded[group] = samples
+
+        return decoded
+
+    def _decode_samples(self, data):
+        # little-endian two's complement 24-bit (BDF) or 16-bit (EDF) values
+        data = data.reshape(-1, self.bytes_per_sample).astype(np.int32)
+        if self.bytes_per_sample == 3:
+            values = data[:, 0] | (data[:, 1] << 8) | (data[:, 2] << 16)
+            return (values ^ 0x800000) - 0x800000
 
-        raw = self.edf.readSignal(channel_index)[start:end]
-        return raw
+        values = data[:, 0] | (data[:, 1] << 8)
+        return (values ^ 0x8000) - 0x8000
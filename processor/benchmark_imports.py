@@ -0,0 +1,35 @@
+"""
+Measures the cold start (import) time of each of the processor's code paths.
+
+Every measurement runs in a fresh interpreter so no module is cached between runs:
+
+    python benchmark_imports.py [repeat]
+"""
+import statistics
+import os
+import subprocess
+import sys
+
+CODE_PATHS = {
+    'main':     'import main',
+    'probe':    'import main, bdf_header',
+    'convert':  'import main, bdf_header, bdf_reader, writer',
+    'nwb':      'import main, nwb_driver, writer',
+    'importer': 'import importer',
+}
+
+PROCESSOR_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def measure(statement):
+    code = f"import time; started = time.perf_counter(); {statement}; print(time.perf_counter() - started)"
+    # mirror the container, which runs from the processor directory with its parent on the PYTHONPATH
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(PROCESSOR_DIR))
+    output = subprocess.run([sys.executable, '-c', code], cwd=PROCESSOR_DIR, env=env, capture_output=True, text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    for name, statement in CODE_PATHS.items():
+        timings = [measure(statement) for _ in range(repeat)]
+        print(f"{name:<10} median={statistics.median(timings) * 1e3:8.1f}ms min={min(timings) * 1e3:8.1f}ms ({statement})")
@@ -0,0 +1,163 @@
+import json
+import logging
+import os
+import struct
+import threading
+
+from constants import TIME_SERIES_CHECKPOINT_FILE_NAME
+
+log = logging.getLogger()
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+def is_complete_gzip_file(file_path, expected_size):
+    """
+    Cheaply validates a gzipped file without decompressing it: the file must start with the
+    gzip magic number and its trailer must hold the expected uncompressed size (modulo 2^32)
+    """
+    try:
+        with open(file_path, 'rb') as file:
+            if file.read(2) != GZIP_MAGIC:
+                return False
+            file.seek(-4, os.SEEK_END)
+            return struct.unpack('<I', file.read(4))[0] == expected_size % (1 << 32)
+    except OSError:
+        return False
+
+class ConversionCheckpoint:
+    """
+    Append-only log of the (channel, window) units completed by the writer, kept in the output directory.
+
+    The first line identifies the conversion (the fingerprint) and the chunk size it was started with,
+    every following line records a completed unit: the channel index, the window's start / end (in microseconds),
+    the chunk file name, its uncompressed size and the chunk's statistics.
+
+    Each line is appended with a single write after its chunk file has been renamed into place, so a
+    preempted run leaves at most a partial last line, which is ignored when loading.
+
+    Attributes:
+        output_dir (str): path to output directory holding the chunk files and the checkpoint
+        fingerprint (dict): identifies the source and output format, a checkpoint with a differing fingerprint is discarded
+    """
+
+    def __init__(self, output_dir, fingerprint):
+        self.output_dir = output_dir
+        self.fingerprint = fingerprint
+        self.file_path = os.path.join(output_dir, TIME_SERIES_CHECKPOINT_FILE_NAME)
+
+        self.chunk_size = None
+        self._completed = {}
+        self._lock = threading.Lock()
+        self._fd = None
+
+    def open(self, chunk_size):
+        """
+        Loads the units completed by a previous run with the same fingerprint, otherwise starts a new checkpoint.
+
+        Returns the chunk size to use, which is the previous run's chunk size when resuming
+        so that the windows of both runs line up.
+        """
+        self._remove_partial_files()
+
+        previous = self._load()
+        if previous is not None:
+            self.chunk_size, self._completed = previous
+            self._fd = os.open(self.file_path, os.O_WRONLY | os.O_APPEND)
+            # terminate a partial last line so it is not merged with the next unit
+            if os.path.getsize(self.file_path) > 0:
+                with open(self.file_path, 'rb') as file:
+                    file.seek(-1, os.SEEK_END)
+                    if file.read(1) != b'\n':
+                        os.write(self._fd, b'\n')
+            log.info(f"resuming conversion with {len(self._completed)} completed chunks from {self.file_path}")
+        else:
+            self.restart(chunk_size)
+
+        return self.chunk_size
+
+    def restart(self, chunk_size):
+        """
+        Discards the units (and chunk files) of any previous run, starting a new checkpoint for the given chunk size
+        """
+        self.close()
+
+        # the chunk files of the discarded units do not line up with the new run's windows
+        for unit in self._completed.values():
+            file_path = os.path.join(self.output_dir, unit['file'])
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+        self.chunk_size = chunk_size
+        self._completed = {}
+        self._fd = os.open(self.file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+        self._append({'fingerprint': self.fingerprint, 'chunk_size': chunk_size})
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def completed(self, channel, start_time, end_time):
+        """
+        Returns the recorded unit of the given channel and window if its chunk file is complete on disk, otherwise None
+        """
+        unit = self._completed.get(self._key(channel.index, start_time, end_time))
+        if unit is None:
+            return None
+
+        if not is_complete_gzip_file(os.path.join(self.output_dir, unit['file']), unit['size']):
+            log.warning(f"discarding checkpointed chunk {unit['file']}, file is missing or incomplete")
+            return None
+
+        return unit
+
+    def record(self, channel, start_time, end_time, file_name, size, statistics):
+        self._append({
+            'channel':    channel.index,
+            'start':      int(start_time * 1e6),
+            'end':        int(end_time * 1e6),
+            'file':       file_name,
+            'size':       size,
+            'statistics': [float(value) for value in statistics],
+        })
+
+    def _append(self, entry):
+        line = (json.dumps(entry) + '\n').encode('utf-8')
+        with self._lock:
+            os.write(self._fd, line)
+
+    def _load(self):
+        if not os.path.exists(self.file_path):
+            return None
+
+        with open(self.file_path, 'r') as file:
+            lines = file.read().split('\n')
+
+        try:
+            header = json.loads(lines[0])
+        except json.JSONDecodeError:
+            return None
+
+        if header.get('fingerprint') != self.fingerprint:
+            log.info(f"discarding checkpoint {self.file_path}, it belongs to a different conversion")
+            return None
+
+        completed = {}
+        for line in lines[1:]:
+            try:
+                unit = json.loads(line)
+            except json.JSONDecodeError:
+                # partial line of a preempted run
+                continue
+            completed[(unit['channel'], unit['start'], unit['end'])] = unit
+
+        return header['chunk_size'], completed
+
+    def _remove_partial_files(self):
+        for entry in os.scandir(self.output_dir):
+            if entry.is_file() and entry.name.endswith('.tmp'):
+                os.remove(entry.path)
+
+    @staticmethod
+    def _key(channel_index, start_time, end_time):
+        return (channel_index, int(start_time * 1e6), int(end_time * 1e6))
@@ -1,4 +1,3 @@
-import boto3
 import requests
 import json
 import logging
@@ -20,6 +19,9 @@ class AuthenticationClient:
             cognito_app_client_id = data["tokenPool"]["appClientId"]
             cognito_region = data["region"]
 
+            # boto3 is only needed once authenticating, keep it off the import path
+            import boto3
+
             cognito_idp_client = boto3.client(
                 "cognito-idp",
                 region_name=cognito_region,
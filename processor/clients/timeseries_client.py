@@ -43,6 +43,36 @@ class TimeSeriesClient(BaseClient):
             log.error("failed to create time series channel: %s", e)
             raise e
 
+    @BaseClient.retry_with_refresh
+    def update_channel(self, package_id, channel):
+        url = f"{self.api_host}/timeseries/{package_id}/channels/{channel.id}"
+
+        headers = {
+            "Content-type": "application/json",
+            "Authorization": f"Bearer {self.session_manager.session_token}"
+        }
+
+        body = channel.as_dict()
+        body['channelType'] = body.pop('type')
+
+        try:
+            response = requests.put(url, headers=headers, json=body)
+            response.raise_for_status()
+            data = response.json()
+            updated_channel = TimeSeriesChannel.from_dict(data['content'], data['properties'])
+            updated_channel.index = channel.index
+
+            return updated_channel
+        except requests.HTTPError as e:
+            log.error("failed to update time series channel %s: %s", channel.id, e)
+            raise e
+        except json.JSONDecodeError as e:
+            log.error("failed to decode time series channel response: %s", e)
+            raise e
+        except Exception as e:
+            log.error("failed to update time series channel: %s", e)
+            raise e
+
     @BaseClient.retry_with_refresh
     def get_package_channels(self, package_id):
         url = f"{self.api_host}/timeseries/{package_id}/channels"
@@ -19,6 +19,42 @@ class Config:
 
         self.CHUNK_SIZE_MB        = int(os.getenv('CHUNK_SIZE_MB', '1'))
 
+        # decimation factors of the min/max overview levels written alongside the chunks (empty to disable)
+        # note: overviews are not written when streaming chunks to the import (STREAMING_UPLOAD)
+        self.OVERVIEW_FACTORS     = [int(factor) for factor in os.getenv('OVERVIEW_FACTORS', '10,100,1000').split(',') if factor.strip()]
+
+        # per-chunk statistics (min, max, mean, RMS, NaN count, flatline) index written alongside the chunks
+        self.STATS_ENABLED        = getboolenv('STATS_ENABLED', True)
+
+        # sample format of the chunk files: float64, or the compact int32 / int24 digital values
+        # note: compact chunks (.ibin.gz) are not picked up by the importer
+        self.OUTPUT_FORMAT        = os.getenv('OUTPUT_FORMAT', 'float64')
+        self.DELTA_ENCODING       = getboolenv('DELTA_ENCODING', False)
+
+        # memory budget from which the read window, queue depth and worker count are derived (0 for no limit)
+        self.MAX_MEMORY_MB        = int(os.getenv('MAX_MEMORY_MB', '0'))
+
+        # checkpoint completed chunks to the output directory and resume a preempted conversion from them
+        self.CHECKPOINT_ENABLED   = getboolenv('CHECKPOINT_ENABLED', True)
+
+        # split the conversion into (channel x time) shards, each converted by a separate process / container
+        # SHARD_INDEX selects the single shard converted by this container (all shards as local processes when unset)
+        self.SHARD_CHANNEL_COUNT  = int(os.getenv('SHARD_CHANNEL_COUNT', '1'))
+        self.SHARD_TIME_COUNT     = int(os.getenv('SHARD_TIME_COUNT', '1'))
+        self.SHARD_INDEX          = int(os.getenv('SHARD_INDEX')) if os.getenv('SHARD_INDEX') else None
+        self.SHARD_PROCESSES      = int(os.getenv('SHARD_PROCESSES', str(os.cpu_count() or 1)))
+
+        # compress chunks in memory and upload them straight to the import instead of writing the chunk files
+        # (requires the importer), STREAMING_BUFFER_MB bounds the compressed chunks held in memory while uploading
+        self.STREAMING_UPLOAD     = getboolenv('STREAMING_UPLOAD', False)
+        self.STREAMING_BUFFER_MB  = int(os.getenv('STREAMING_BUFFER_MB', '64'))
+
+        # follow a file that is still being recorded, ingesting the appended data records every FOLLOW_INTERVAL_SECONDS
+        # until the file has not grown for FOLLOW_IDLE_TIMEOUT_SECONDS
+        self.FOLLOW_ENABLED       = getboolenv('FOLLOW_ENABLED', False)
+        self.FOLLOW_INTERVAL      = float(os.getenv('FOLLOW_INTERVAL_SECONDS', '30'))
+        self.FOLLOW_IDLE_TIMEOUT  = float(os.getenv('FOLLOW_IDLE_TIMEOUT_SECONDS', '3600'))
+
         # continue to use INTEGRATION_ID environment variable until runner
         # has been converted to use  a different variable to represent the workflow instance ID
         self.WORKFLOW_INSTANCE_ID = os.getenv('INTEGRATION_ID', str(uuid.uuid4()))
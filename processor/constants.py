@@ -1,2 +1,11 @@
 TIME_SERIES_BINARY_FILE_EXTENSION='.bin.gz'
 TIME_SERIES_METADATA_FILE_EXTENSION='.metadata.json'
+TIME_SERIES_CHANNEL_TABLE_FILE_NAME='channels.table.json'
+TIME_SERIES_INTEGER_BINARY_FILE_EXTENSION='.ibin.gz'
+TIME_SERIES_ENCODING_FILE_EXTENSION='.encoding.json'
+TIME_SERIES_OVERVIEW_FILE_EXTENSION='.overview.gz'
+TIME_SERIES_OVERVIEW_METADATA_FILE_EXTENSION='.overview.json'
+TIME_SERIES_STATS_FILE_NAME='chunk-stats.index.npz'
+TIME_SERIES_CHECKPOINT_FILE_NAME='.conversion.checkpoint'
+TIME_SERIES_SHARD_MANIFEST_FILE_NAME='shard.manifest.json'
+TIME_SERIES_FOLLOW_STATE_FILE_NAME='.follow.state'
@@ -0,0 +1,142 @@
+import json
+import logging
+import os
+import time
+
+from bdf_header import BDFHeader
+from constants import TIME_SERIES_FOLLOW_STATE_FILE_NAME
+from sharding import Shard
+
+log = logging.getLogger()
+
+"""
+Follows a BDF / EDF file that is still being recorded: the file's header is re-read on an interval
+and the data records appended since the previous increment are converted (and imported) on their own,
+so recorded data becomes available within about an increment without reprocessing what was already ingested.
+Once the file stops growing the outputs of all increments are merged, as those of the shards of a conversion.
+"""
+
+class RecordingFollower:
+    """
+    Each increment covers the newly appended data records, as a time shard of the file spanning all channels.
+    Increments end on a chunk window (see BDFHeader.records_per_chunk) so their chunks are those of a
+    conversion of the whole file, which bounds the ingest latency to about a chunk window of data records
+    (e.g. 64 records for chunks of 131072 samples of 2048Hz); the records after the last complete window
+    are only ingested once the file stops growing.
+
+    The number of ingested records and the increments not merged yet are kept in a state file in the output directory,
+    so a restarted follower continues after the last ingested increment.
+
+    Attributes:
+        input_file (str): path to the BDF / EDF file being recorded
+        output_dir (str): path to output directory, each increment is converted into its own directory within it
+        chunk_size (int): number of samples per channel per chunk
+        records (int): number of data records ingested
+        increments (int): number of increments ingested
+        pending (list[Shard]): ingested increments whose outputs have not been merged
+    """
+    def __init__(self, input_file, output_dir, chunk_size):
+        self.input_file = input_file
+        self.output_dir = output_dir
+        self.chunk_size = chunk_size
+        self.state_path = os.path.join(output_dir, TIME_SERIES_FOLLOW_STATE_FILE_NAME)
+
+        self.records = 0
+        self.increments = 0
+        self.pending = []
+
+    def load(self, header):
+        """
+        Continues from the state of a previous follower of the same recording, if any
+        """
+        if not os.path.exists(self.state_path):
+            return
+
+        with open(self.state_path, 'r') as file:
+            state = json.load(file)
+
+        if state['file'] != os.path.basename(self.input_file) or state['start'] != header.start_datetime.isoformat():
+            log.info(f"discarding follow state {self.state_path}, it belongs to a different recording")
+            return
+
+        self.records = state['records']
+        self.increments = state['increments']
+        self.pending = [Shard.from_dict(increment) for increment in state['pending']]
+        log.info(f"continuing to follow {self.input_file} after {self.records} ingested data records")
+
+    def next_increment(self, header, final=False):
+        """
+        Returns the next increment (shard) of the recording given its current header,
+        or None when no complete chunk window (any record, when final) has been appended
+        """
+        if final:
+            record_end = header.num_records
+        else:
+            window_records = header.records_per_chunk(self.chunk_size)
+            record_end = header.num_records - header.num_records % window_records
+
+        if record_end <= self.records:
+            return None
+
+        return Shard(self.increments, 0, len(header.data_signals), self.records, record_end)
+
+    def complete(self, header, increment):
+        self.records = increment.record_end
+        self.increments = increment.index + 1
+        self.pending.append(increment)
+        self.save(header)
+
+    def save(self, header):
+        state = {
+            'file':       os.path.basename(self.input_file),
+            'start':      header.start_datetime.isoformat(),
+            'records':    self.records,
+            'increments': self.increments,
+            'pending':    [increment.as_dict() for increment in self.pending],
+        }
+        with open(self.state_path + '.tmp', 'w') as file:
+            json.dump(state, file)
+        os.replace(self.state_path + '.tmp', self.state_path)
+
+    def run(self, ingest, merge, interval, idle_timeout):
+        """
+        Ingests the increments of the recording as they are appended, by calling ingest(increment)
+
+        Polls the header every interval seconds and stops once the file has not grown for idle_timeout seconds,
+        ingesting the remaining records (a partial chunk window) and calling merge(increments) with all
+        increments not merged yet before stopping.
+        """
+        header = BDFHeader.read(self.input_file)
+        self.load(header)
+
+        window_records = header.records_per_chunk(self.chunk_size)
+        log.info(f"following {self.input_file} in increments of {window_records} data records ({window_records * header.record_duration}s)")
+
+        last_growth = time.monotonic()
+        num_records = header.num_records
+
+        while True:
+            # only the header is read, the record count is inferred from the file size while it is not set
+            header = BDFHeader.read(self.input_file)
+            if header.num_records > num_records:
+                num_records = header.num_records
+                last_growth = time.monotonic()
+
+            idle = time.monotonic() - last_growth >= idle_timeout
+
+            increment = self.next_increment(header, final=idle)
+            if increment is not None:
+                started = time.monotonic()
+                ingest(increment)
+                self.complete(header, increment)
+                log.info(f"ingested data records {increment.record_start}-{increment.record_end} of {self.input_file} in {time.monotonic() - started:.1f}s")
+
+            if idle:
+                log.info(f"{self.input_file} has not grown for {idle_timeout}s, stopped following after {self.records} data records")
+                if self.pending:
+                    merge(self.pending)
+                    self.pending = []
+                    self.save(header)
+                return
+
+            time.sleep(interval)
@@ -0,0 +1,130 @@
+import gc
+import logging
+import os
+import resource
+import sys
+import threading
+
+log = logging.getLogger()
+
+BYTES_PER_MB = pow(2, 20)
+
+# copies of a chunk's sample data alive while it is in flight
+# (read samples, formatted big-endian bytes and compression buffers)
+CHUNK_COPIES = 3
+
+# smallest read window (samples per channel) the governor will shrink the chunk size to
+MIN_CHUNK_SIZE = 4096
+
+# fraction of the memory budget above which producers are held back
+HIGH_WATERMARK = 0.9
+
+def current_rss():
+    """
+    Returns the resident set size (in bytes) of the current process.
+
+    Falls back to the peak resident set size where /proc is unavailable.
+    """
+    try:
+        with open('/proc/self/statm', 'r') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # reported in kilobytes on linux and bytes on macOS
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+class MemoryGovernor:
+    """
+    Derives the read window (chunk size), number of writer workers and the number of
+    chunks allowed in flight from a memory budget and the dimensions of the recording.
+
+    While running, producers acquire a slot for each chunk they read. Acquiring blocks
+    while the queue is full or while the process' RSS is above the high watermark of the
+    budget (and chunks are still in flight to free memory), so a large recording slows
+    down instead of being OOM-killed.
+
+    A budget of 0 disables the memory limit, in which case only the queue depth bounds the producers.
+
+    A window which must not change (e.g. of a shard, whose chunks must line up with those of the other shards)
+    is kept as is (shrink=False), only the queue depth and workers are then fitted to the budget.
+
+    The cost of a window is the chunks in flight (CHUNK_COPIES copies of chunk_size samples each) plus the reader's
+    read and decode buffers, which hold about a window of every channel (buffer_bytes_per_sample for each sample of the window),
+    so the window shrinks with the number of channels.
+
+    Attributes:
+        max_memory_bytes (int): memory budget of the process in bytes (0 when unlimited)
+        chunk_size (int): number of samples per channel read and written per chunk
+        workers (int): number of concurrent chunk writer workers
+        queue_depth (int): maximum number of chunks read but not yet written
+    """
+
+    def __init__(self, max_memory_mb, num_channels, num_samples, chunk_size, bytes_per_sample=8, resident_bytes=0, timestamp_bytes=0, buffer_bytes_per_sample=0, shrink=True):
+        self.max_memory_bytes = int(max_memory_mb * BYTES_PER_MB)
+        self.chunk_size = chunk_size
+
+        cpu_count = os.cpu_count() or 1
+
+        if self.max_memory_bytes <= 0:
+            self.workers = min(4, cpu_count)
+            self.queue_depth = 2 * self.workers
+        else:
+            # memory held for the whole run: the interpreter and loaded libraries, the timestamps
+            # held by the reader (if any) and any per-channel buffers held by the writer
+            fixed_bytes = current_rss() + timestamp_bytes + resident_bytes
+            available_bytes = self.max_memory_bytes - fixed_bytes
+
+            if available_bytes <= 0:
+                log.warning(f"memory budget of {max_memory_mb}MB is below the estimated fixed usage of {fixed_bytes // BYTES_PER_MB}MB")
+
+            chunk_bytes = chunk_size * bytes_per_sample * CHUNK_COPIES
+            max_in_flight = int(max(0, available_bytes - chunk_size * buffer_bytes_per_sample) // chunk_bytes)
+
+            if max_in_flight < 2 and not shrink:
+                log.warning(f"memory budget of {max_memory_mb}MB does not fit the fixed chunk size {chunk_size}")
+                max_in_flight = 2
+            elif max_in_flight < 2:
+                # shrink the read window so the decode buffers fit alongside one chunk being read while another is written
+                self.chunk_size = max(MIN_CHUNK_SIZE, int(max(0, available_bytes) // (buffer_bytes_per_sample + 2 * bytes_per_sample * CHUNK_COPIES)))
+                self.chunk_size = min(self.chunk_size, chunk_size)
+                max_in_flight = 2
+
+            self.workers = max(1, min(cpu_count, max_in_flight // 2))
+            self.queue_depth = max(self.workers, min(max_in_flight, 4 * self.workers))
+
+        self._in_flight = 0
+        self._throttled = False
+        self._condition = threading.Condition()
+
+        log.info(f"memory budget={max_memory_mb}MB channels={num_channels} samples={num_samples} chunk_size={self.chunk_size} workers={self.workers} queue_depth={self.queue_depth}")
+
+    def acquire(self):
+        """
+        Blocks until a chunk may be read, applying backpressure when the queue
+        is full or the process' memory usage nears the budget.
+        """
+        with self._condition:
+            while self._in_flight >= self.queue_depth or (self._in_flight > 0 and self._over_limit()):
+                # poll so that memory released outside of the queue is also noticed
+                self._condition.wait(timeout=0.05)
+
+            self._in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def _over_limit(self):
+        if self.max_memory_bytes <= 0:
+            return False
+
+        over_limit = current_rss() > self.max_memory_bytes * HIGH_WATERMARK
+        if over_limit:
+            gc.collect()
+
+        if over_limit != self._throttled:
+            self._throttled = over_limit
+            log.info(f"memory usage {'above' if over_limit else 'below'} {int(HIGH_WATERMARK * 100)}% of budget, {'throttling' if over_limit else 'resuming'} reads")
+
+        return over_limit
@@ -12,9 +12,9 @@ from clients import SessionManager
 from clients import TimeSeriesClient
 from clients import WorkflowClient, WorkflowInstance
 
-from constants import TIME_SERIES_BINARY_FILE_EXTENSION, TIME_SERIES_METADATA_FILE_EXTENSION
+from constants import TIME_SERIES_BINARY_FILE_EXTENSION, TIME_SERIES_METADATA_FILE_EXTENSION, TIME_SERIES_CHANNEL_TABLE_FILE_NAME
 
-from timeseries_channel import TimeSeriesChannel
+from timeseries_channel import TimeSeriesChannel, ChannelTable
 
 from concurrent.futures import ThreadPoolExecutor
 from multiprocessing import Value, Lock
@@ -23,6 +23,9 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 
 log = logging.getLogger()
 
+# used to strip the channel index (intra-processor channel identifier) off both data and metadata time series files
+CHANNEL_INDEX_PATTERN = re.compile(r"(channel-\d+)")
+
 """
 Uses the Pennsieve API to initialize and upload time series files
 for import into Pennsieve data ecosystem.
@@ -31,19 +34,120 @@ for import into Pennsieve data ecosystem.
 # easily able to handle > 3 processors
 """
 
+class TimeSeriesImport:
+    """
+    An initialized import, each of its time series data files is uploaded to the
+    Pennsieve S3 import bucket with its own pre-signed URL
+
+    Attributes:
+        import_client (ImportClient): client of the import API
+        import_id (str): ID of the initialized import
+        dataset_id (str): ID of the dataset imported into
+        files (dict[str, ImportFile]): files of the import by their local (chunk) file name
+    """
+    def __init__(self, import_client, import_id, dataset_id, files):
+        self.import_client = import_client
+        self.import_id = import_id
+        self.dataset_id = dataset_id
+        self.files = files
+
+        # track time series file upload count
+        self.upload_counter = Value('i', 0)
+        self.upload_counter_lock = Lock()
+
+    def upload(self, file_name, data=None):
+        """
+        Uploads a file of the import, from the given (in-memory) data or otherwise from its local path
+        """
+        import_file = self.files[file_name]
+
+        log.info(f"import_id={self.import_id} upload_key={import_file.upload_key} uploading {import_file.file_path}")
+        upload_url = self.import_client.get_presign_url(self.import_id, self.dataset_id, import_file.upload_key)
+        if data is None:
+            with open(import_file.local_path, 'rb') as f:
+                response = requests.put(upload_url, data=f)
+        else:
+            response = requests.put(upload_url, data=data)
+        response.raise_for_status()  # raise an error if the request failed
+
+        with self.upload_counter_lock:
+            self.upload_counter.value += 1
+            log.info(f"import_id={self.import_id} upload_key={import_file.upload_key} uploaded {self.upload_counter.value}/{len(self.files)} {import_file.local_path}")
+
+    # upload time series files to Pennsieve S3 import bucket
+    @backoff.on_exception(
+        backoff.expo,
+        requests.exceptions.RequestException,
+        max_tries=5
+    )
+    def upload_file(self, file_name):
+        """
+        Uploads a file of the import from its local path, retrying failed uploads
+        """
+        try:
+            self.upload(file_name)
+            return True
+        except Exception as e:
+            log.error(f"import_id={self.import_id} upload_key={self.files[file_name].upload_key} failed to upload {self.files[file_name].local_path}: %s", e)
+            raise e
+
+    @property
+    def uploaded(self):
+        return self.upload_counter.value
+
 def import_timeseries(api_host, api2_host, api_key, api_secret, workflow_instance_id, file_directory):
     # gather all the time series files from the output directory
     timeseries_data_files = []
     timeseries_channel_files = []
+    timeseries_channel_tables = []
 
     for root, _, files in os.walk(file_directory):
         for file in files:
-            if file.endswith(TIME_SERIES_METADATA_FILE_EXTENSION):
+            if file == TIME_SERIES_CHANNEL_TABLE_FILE_NAME:
+                timeseries_channel_tables.append(os.path.join(root, file))
+            elif file.endswith(TIME_SERIES_METADATA_FILE_EXTENSION):
                 timeseries_channel_files.append(os.path.join(root, file))
             elif file.endswith(TIME_SERIES_BINARY_FILE_EXTENSION):
                 timeseries_data_files.append(os.path.join(root, file))
 
-    if len(timeseries_channel_files) == 0 or len(timeseries_data_files) == 0:
+    # channel tables (e.g. one per electrical series) hold disjoint channel indices
+    local_channels = {}
+    for file_path in timeseries_channel_tables:
+        for channel in ChannelTable.read(file_path):
+            local_channels[f'channel-{channel.index:05d}'] = channel
+
+    # (per-channel metadata files of earlier outputs)
+    for file_path in timeseries_channel_files:
+        channel_index = CHANNEL_INDEX_PATTERN.search(os.path.basename(file_path)).group(1)
+
+        with open(file_path, 'r') as file:
+            local_channels[channel_index] = TimeSeriesChannel.from_dict(json.load(file))
+
+    timeseries_import = prepare_import(api_host, api2_host, api_key, api_secret, workflow_instance_id, local_channels, timeseries_data_files)
+    if timeseries_import is None:
+        return None
+
+    successful_uploads = list()
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        # wrapping in a list forces the executor to wait for all threads to finish uploading time series files
+        successful_uploads = list(executor.map(timeseries_import.upload_file, timeseries_import.files))
+
+    log.info(f"import_id={timeseries_import.import_id} uploaded {timeseries_import.uploaded} time series files")
+
+    assert sum(successful_uploads) == len(timeseries_import.files), "Failed to upload all time series files"
+
+def prepare_import(api_host, api2_host, api_key, api_secret, workflow_instance_id, local_channels, timeseries_data_files):
+    """
+    Creates (or finds) the package channels of the given local channels and initializes the import of the
+    given time series data files, which do not need to exist (yet) e.g. when their chunks are uploaded from memory
+
+    Args:
+        local_channels (dict[str, TimeSeriesChannel]): channels by their channel index prefix e.g. channel-00000
+        timeseries_data_files (list[str]): local paths of the time series data (chunk) files
+
+    Returns the initialized TimeSeriesImport, or None when there are no channels or data to import
+    """
+    if len(local_channels) == 0 or len(timeseries_data_files) == 0:
         log.info("no time series channels or data")
         return None
 
@@ -62,22 +166,26 @@ def import_timeseries(api_host, api2_host, api_key, api_secret, workflow_instanc
 
     log.info(f"dataset_id={workflow_instance.dataset_id} package_id={package_id} starting import of time series files")
 
-    # used to strip the channel index (intra-processor channel identifier) off both data and metadata time series files
-    channel_index_pattern = re.compile(r"(channel-\d+)")
-
     timeseries_client = TimeSeriesClient(api_host, session_manager)
     existing_channels = timeseries_client.get_package_channels(package_id)
 
-    channels = {}
-    for file_path in timeseries_channel_files:
-        channel_index = channel_index_pattern.search(os.path.basename(file_path)).group(1)
-
-        with open(file_path, 'r') as file:
-            local_channel = TimeSeriesChannel.from_dict(json.load(file))
+    # existing channels by name and type, so matching a local channel only compares the rates of the few candidates
+    existing_candidates = {}
+    for existing_channel in existing_channels:
+        existing_candidates.setdefault((existing_channel.name.casefold(), existing_channel.type.casefold()), []).append(existing_channel)
 
-        channel = next((existing_channel for existing_channel in existing_channels if existing_channel == local_channel), None)
+    channels = {}
+    for channel_index, local_channel in local_channels.items():
+        candidates = existing_candidates.get((local_channel.name.casefold(), local_channel.type.casefold()), [])
+        channel = next((existing_channel for existing_channel in candidates if existing_channel == local_channel), None)
         if channel is not None:
             log.info(f"package_id={package_id} channel_id={channel.id} found existing package channel: {channel.name}")
+            # e.g. the data appended to a recording since its previous import
+            if local_channel.start < channel.start or local_channel.end > channel.end:
+                channel.start = min(channel.start, local_channel.start)
+                channel.end = max(channel.end, local_channel.end)
+                channel = timeseries_client.update_channel(package_id, channel)
+                log.info(f"package_id={package_id} channel_id={channel.id} extended package channel to {channel.start}-{channel.end}: {channel.name}")
         else:
             channel = timeseries_client.create_channel(package_id, local_channel)
             log.info(f"package_id={package_id} channel_id={channel.id} created new time series channel: {channel.name}")
@@ -88,54 +196,21 @@ def import_timeseries(api_host, api2_host, api_key, api_secret, workflow_instanc
     # replace the prefix on the time series binary data chunk file name with the channel node ID e.g.
     # channel-00000_1549968912000000_1549968926998750.bin.gz
     #  => N:channel:c957d73f-84ca-41d9-83b0-d23c2000a6e6_1549968912000000_1549968926998750.bin.gz
-    import_files = []
+    import_files = {}
     for file_path in timeseries_data_files:
-        channel_index = channel_index_pattern.search(os.path.basename(file_path)).group(1)
+        file_name = os.path.basename(file_path)
+        channel_index = CHANNEL_INDEX_PATTERN.search(file_name).group(1)
         channel = channels[channel_index]
-        import_file = ImportFile(
+        import_files[file_name] = ImportFile(
             upload_key=uuid.uuid4(),
-            file_path=re.sub(channel_index_pattern, channel.id, os.path.basename(file_path)),
+            file_path=re.sub(CHANNEL_INDEX_PATTERN, channel.id, file_name),
             local_path = file_path
         )
-        import_files.append(import_file)
 
     # initialize import
     import_client = ImportClient(api2_host, session_manager)
-    import_id = import_client.create(workflow_instance.id, workflow_instance.dataset_id, package_id, import_files)
+    import_id = import_client.create(workflow_instance.id, workflow_instance.dataset_id, package_id, list(import_files.values()))
 
     log.info(f"import_id={import_id} initialized import with {len(import_files)} time series data files for upload")
 
-    # track time series file upload count
-    upload_counter = Value('i', 0)
-    upload_counter_lock = Lock()
-
-    # upload time series files to Pennsieve S3 import bucket
-    @backoff.on_exception(
-        backoff.expo,
-        requests.exceptions.RequestException,
-        max_tries=5
-    )
-    def upload_timeseries_file(timeseries_file):
-        try:
-            with upload_counter_lock:
-                upload_counter.value += 1
-                log.info(f"import_id={import_id} upload_key={timeseries_file.upload_key} uploading {upload_counter.value}/{len(import_files)} {timeseries_file.local_path}")
-            upload_url = import_client.get_presign_url(import_id, workflow_instance.dataset_id, timeseries_file.upload_key)
-            with open(timeseries_file.local_path, 'rb') as f:
-                response = requests.put(upload_url, data=f)
-                response.raise_for_status()  # raise an error if the request failed
-            return True
-        except Exception as e:
-            with upload_counter_lock:
-                upload_counter.value -= 1
-            log.error(f"import_id={import_id} upload_key={timeseries_file.upload_key} failed to upload {timeseries_file.local_path}: %s", e)
-            raise e
-
-    successful_uploads = list()
-    with ThreadPoolExecutor(max_workers=4) as executor:
-        # wrapping in a list forces the executor to wait for all threads to finish uploading time series files
-        successful_uploads = list(executor.map(upload_timeseries_file, import_files))
-
-    log.info(f"import_id={import_id} uploaded {upload_counter.value} time series files")
-
-    assert sum(successful_uploads) == len(import_files), "Failed to upload all time series files"
+    return TimeSeriesImport(import_client, import_id, workflow_instance.dataset_id, import_files)
@@ -1,49 +1,361 @@
-import os
+import argparse
+import json
 import logging
-import pyedflib
-from datetime import datetime, timezone
-
-from pynwb import NWBHDF5IO
-from pynwb.ecephys import ElectricalSeries
+import os
+import time
 
 from config import Config
-from importer import import_timeseries
-from writer import TimeSeriesChunkWriter
-from bdf_reader import BDFElectricalSeriesReader
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 log = logging.getLogger()
 
-if __name__ == "__main__":
-    config = Config()
-
-    bytes_per_mb = pow(2, 20)
-    bytes_per_sample = 8 # 64-bit floating point value
-    chunk_size = int(config.CHUNK_SIZE_MB * bytes_per_mb / bytes_per_sample)
+# heavy dependencies (numpy, boto3, ...) are imported by the code path that needs them
+# so that probing, and processing without the importer, do not pay for them at startup
 
+def find_input_file(config):
     input_files = [
         f.path
         for f in os.scandir(config.INPUT_DIR)
-        if f.is_file() and os.path.splitext(f.name)[1].lower() == '.bdf'
+        if f.is_file() and os.path.splitext(f.name)[1].lower() in ('.bdf', '.edf', '.nwb')
     ]
 
-    assert len(input_files) == 1, "BDF post processor only supports a single file as input"
+    assert len(input_files) == 1, "Post processor only supports a single (BDF, EDF or NWB) file as input"
+
+    return input_files[0]
+
+def get_chunk_size(config):
+    bytes_per_mb = pow(2, 20)
+    bytes_per_sample = 8 # 64-bit floating point value (upper bound for the compact integer formats)
+    return int(config.CHUNK_SIZE_MB * bytes_per_mb / bytes_per_sample)
+
+def probe(input_file, config, chunk_size):
+    """
+    Describes the conversion of the given file using only its header:
+    channels, sampling rates, duration, the expected number and (uncompressed) size of the chunk files
+    and the number of all output files (chunks and their sidecars) the writer produces with the given config
+
+    With a memory budget the chunk size is the one the conversion's memory governor fits to the budget,
+    which loads the reader's and writer's dependencies (numpy), otherwise only the header is parsed
+    """
+    from bdf_header import BDFHeader
+
+    started = time.perf_counter()
+    header = BDFHeader.read(input_file)
+
+    if config.MAX_MEMORY_MB > 0:
+        from bdf_reader import BDFElectricalSeriesReader
+
+        chunked_writer = create_writer(config, header.start_datetime, config.OUTPUT_DIR, chunk_size, checkpoint=False)
+        chunk_size = chunked_writer.memory_governor(BDFElectricalSeriesReader(header)).chunk_size
+
+    # chunk windows span whole data records (see BDFHeader.records_per_chunk)
+    num_windows = -(-header.num_records // header.records_per_chunk(chunk_size))
+
+    channels = []
+    for index, signal in header.data_signals:
+        num_samples = header.num_records * signal.samples_per_record
+        channels.append({
+            'index':   index,
+            'name':    signal.label,
+            'unit':    signal.physical_dimension,
+            'rate':    header.sampling_rate(signal),
+            'samples': num_samples,
+            'chunks':  num_windows,
+        })
+
+    num_chunks = sum(channel['chunks'] for channel in channels)
+    bytes_per_sample = 8 if config.OUTPUT_FORMAT == 'float64' else int(config.OUTPUT_FORMAT[len('int'):]) // 8
+
+    # single channel table, per-channel encodings of the compact formats, per-channel overview metadata
+    # and a file per level (of the single contiguous segment of a BDF channel), statistics index and checkpoint
+    num_sidecars = 1
+    if config.OUTPUT_FORMAT != 'float64':
+        num_sidecars += len(channels)
+    if config.OVERVIEW_FACTORS:
+        num_sidecars += len(channels) * (1 + len(config.OVERVIEW_FACTORS))
+    if config.STATS_ENABLED:
+        num_sidecars += 1
+    if config.CHECKPOINT_ENABLED:
+        num_sidecars += 1
+
+    return {
+        'file':            input_file,
+        'format':          'BDF' if header.is_bdf else 'EDF',
+        'start':           header.start_datetime.isoformat(),
+        'duration':        header.duration,
+        'num_records':     header.num_records,
+        'record_duration': header.record_duration,
+        'channels':        channels,
+        'chunk_size':      chunk_size,
+        'chunk_files':     num_chunks,
+        'output_files':    num_chunks + num_sidecars,
+        # chunks are written as 64-bit (8 byte) samples, or the 32 / 24-bit samples of the compact formats, before compression
+        'output_bytes':    sum(channel['samples'] for channel in channels) * bytes_per_sample,
+        'probe_ms':        round((time.perf_counter() - started) * 1e3, 3),
+    }
+
+def convert(input_file, config, chunk_size, shard=None):
+    """
+    Converts the given file, or only the given shard of it into the shard's own output directory
+    """
+    from bdf_header import BDFHeader
+    from bdf_reader import BDFElectricalSeriesReader
+
+    header = BDFHeader.read(input_file)
+
+    # the header's start time is given in UTC
+    session_start_time = header.start_datetime
+
+    output_dir = config.OUTPUT_DIR
+    if shard is None:
+        reader = BDFElectricalSeriesReader(header, session_start_time)
+    else:
+        log.info(f"converting {shard}")
+        output_dir = shard.output_dir(config.OUTPUT_DIR)
+        os.makedirs(output_dir, exist_ok=True)
+        reader = BDFElectricalSeriesReader(
+            header,
+            session_start_time,
+            channel_range=(shard.channel_start, shard.channel_end),
+            record_range=(shard.record_start, shard.record_end)
+        )
+
+    chunked_writer = create_writer(config, session_start_time, output_dir, chunk_size)
+
+    # a shard's chunks must line up with those of the other shards (and of the plan), so its chunk size is kept as planned
+    governor = chunked_writer.memory_governor(reader, shrink=False) if shard is not None else None
+    chunked_writer.write_electrical_series(reader, governor)
+
+    if shard is not None:
+        from sharding import write_shard_manifest
+        write_shard_manifest(config.OUTPUT_DIR, shard)
+
+def convert_and_upload(input_file, config, chunk_size, shard=None):
+    """
+    Converts the given file (or only the given shard of it into the shard's own output directory)
+    uploading each chunk from memory as it is compressed, without writing the chunk files
+
+    The chunk files are planned from the header before any sample data is read, so the import can be initialized up front
+    """
+    from bdf_header import BDFHeader
+    from bdf_reader import BDFElectricalSeriesReader
+    from importer import prepare_import
+    from sink import UploadChunkSink
+
+    # the import only accepts 64-bit floating point chunks, whether converting a whole file or an increment of it
+    assert config.OUTPUT_FORMAT == 'float64', "Streaming upload only supports 64-bit floating point chunks"
+
+    header = BDFHeader.read(input_file)
+    session_start_time = header.start_datetime
+
+    output_dir = config.OUTPUT_DIR
+    if shard is None:
+        reader = BDFElectricalSeriesReader(header, session_start_time)
+    else:
+        output_dir = shard.output_dir(config.OUTPUT_DIR)
+        os.makedirs(output_dir, exist_ok=True)
+        reader = BDFElectricalSeriesReader(
+            header,
+            session_start_time,
+            channel_range=(shard.channel_start, shard.channel_end),
+            record_range=(shard.record_start, shard.record_end)
+        )
+
+    sink = UploadChunkSink(config.STREAMING_BUFFER_MB)
+    # checkpointed chunks refer to local chunk files, which are not written when streaming, nor are the overviews
+    # (about a fifth of the chunks' size) which are not imported and would fill the local disk streaming avoids
+    if config.OVERVIEW_FACTORS:
+        log.info("overviews are not written when streaming chunks to the import")
+    chunked_writer = create_writer(config, session_start_time, output_dir, chunk_size, checkpoint=False, overviews=False, sink=sink)
+
+    governor = chunked_writer.memory_governor(reader, shrink=shard is None)
+    chunk_files = [os.path.join(output_dir, file_name) for file_name in chunked_writer.chunk_file_names(reader, governor.chunk_size)]
+    channels = {f'channel-{channel.index:05d}': channel for channel in reader.channels}
+
+    timeseries_import = prepare_import(config.API_HOST, config.API_HOST2, config.API_KEY, config.API_SECRET, config.WORKFLOW_INSTANCE_ID, channels, chunk_files)
+    if timeseries_import is None:
+        return
+
+    sink.open(timeseries_import)
+    chunked_writer.write_electrical_series(reader, governor)
+    sink.close()
+
+    if shard is not None:
+        from sharding import write_shard_manifest
+        write_shard_manifest(config.OUTPUT_DIR, shard)
+
+def follow(input_file, config, chunk_size):
+    """
+    Ingests the data records appended to a file that is still being recorded, one increment at a time
+
+    Each increment is converted (and imported) into its own directory, as a time shard of the file, whose outputs
+    are merged into the output directory once the file stops growing. Imported chunk files are removed right away,
+    the increment's other outputs (channel table, overviews, statistics) are kept for the merge.
+    """
+    from constants import TIME_SERIES_BINARY_FILE_EXTENSION
+    from follow import RecordingFollower
+    from sharding import merge_shards, write_shard_manifest
+
+    def ingest(increment):
+        if config.STREAMING_UPLOAD:
+            convert_and_upload(input_file, config, chunk_size, increment)
+            return
+
+        convert(input_file, config, chunk_size, increment)
+
+        if config.IMPORTER_ENABLED:
+            output_dir = increment.output_dir(config.OUTPUT_DIR)
+            import_output(config, output_dir)
+
+            # the increment's (imported) chunk files are no longer needed
+            for entry in os.scandir(output_dir):
+                if entry.name.endswith(TIME_SERIES_BINARY_FILE_EXTENSION):
+                    os.remove(entry.path)
+            write_shard_manifest(config.OUTPUT_DIR, increment)
+
+    follower = RecordingFollower(input_file, config.OUTPUT_DIR, chunk_size)
+    follower.run(ingest, lambda increments: merge_shards(config.OUTPUT_DIR, increments), config.FOLLOW_INTERVAL, config.FOLLOW_IDLE_TIMEOUT)
+
+def import_output(config, output_dir):
+    from importer import import_timeseries
+
+    if config.OUTPUT_FORMAT != 'float64':
+        log.warning(f"{config.OUTPUT_FORMAT} chunk files are not imported, only 64-bit floating point chunks are supported by the import")
+    import_timeseries(config.API_HOST, config.API_HOST2, config.API_KEY, config.API_SECRET, config.WORKFLOW_INSTANCE_ID, output_dir)
+
+def create_writer(config, session_start_time, output_dir, chunk_size, checkpoint=None, overviews=True, sink=None):
+    from writer import TimeSeriesChunkWriter
+
+    return TimeSeriesChunkWriter(
+        session_start_time,
+        output_dir,
+        chunk_size,
+        overview_factors=config.OVERVIEW_FACTORS if overviews else None,
+        write_stats=config.STATS_ENABLED,
+        output_format=config.OUTPUT_FORMAT,
+        delta_encoding=config.DELTA_ENCODING,
+        max_memory_mb=config.MAX_MEMORY_MB,
+        checkpoint=config.CHECKPOINT_ENABLED if checkpoint is None else checkpoint,
+        sink=sink
+    )
+
+def convert_nwb(input_file, config, chunk_size):
+    """
+    Converts all electrical series of the given NWB file concurrently, each into its own sub-directory of the output directory
+    """
+    from nwb_driver import NWBFileDriver
+
+    driver = NWBFileDriver(input_file, config.OUTPUT_DIR)
+    driver.write(lambda session_start_time, output_dir: create_writer(config, session_start_time, output_dir, chunk_size))
+
+def is_nwb_file(input_file):
+    return os.path.splitext(input_file)[1].lower() == '.nwb'
+
+def plan(input_file, config, chunk_size):
+    from bdf_header import BDFHeader
+    from sharding import plan_shards
+
+    return plan_shards(BDFHeader.read(input_file), config.SHARD_CHANNEL_COUNT, config.SHARD_TIME_COUNT, chunk_size)
+
+def convert_local_shards(input_file, config, chunk_size):
+    """
+    Converts all shards in separate local processes, sharing the memory budget between the processes,
+    and returns the converted shards
+
+    The shards are planned with the chunk size fitting a process' share of the budget for all channels
+    (an upper bound of the channels of each shard), which every shard then keeps
+    """
+    import copy
+    from concurrent.futures import ProcessPoolExecutor
+    from bdf_header import BDFHeader
+    from bdf_reader import BDFElectricalSeriesReader
+
+    processes = max(1, min(config.SHARD_PROCESSES, config.SHARD_CHANNEL_COUNT * config.SHARD_TIME_COUNT))
+
+    shard_config = copy.copy(config)
+    shard_config.MAX_MEMORY_MB = config.MAX_MEMORY_MB // processes
+
+    header = BDFHeader.read(input_file)
+    chunked_writer = create_writer(shard_config, header.start_datetime, config.OUTPUT_DIR, chunk_size, checkpoint=False)
+    chunk_size = chunked_writer.memory_governor(BDFElectricalSeriesReader(header)).chunk_size
+
+    shards = plan(input_file, config, chunk_size)
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        # wrapping in a list waits for all shards and raises the first failure
+        list(executor.map(convert, [input_file] * len(shards), [shard_config] * len(shards), [chunk_size] * len(shards), shards))
+
+    return shards
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Converts a BDF / EDF (or NWB) file into chunked time series files for import")
+    parser.add_argument('--probe', action='store_true', help="only parse the file header and print the expected conversion as JSON")
+    parser.add_argument('--shard-plan', action='store_true', help="only print the (channel x time) shards of the conversion as JSON")
+    parser.add_argument('--shard', type=int, help="only convert the shard with the given index (overrides SHARD_INDEX)")
+    parser.add_argument('--follow', action='store_true', help="follow a file that is still being recorded, ingesting its appended data records (overrides FOLLOW_ENABLED)")
+    parser.add_argument('--merge-shards', action='store_true', help="merge the outputs of all converted shards and import them")
+    parser.add_argument('input_file', nargs='?', help="BDF, EDF or NWB file to process (defaults to the single BDF / EDF / NWB file in the input directory)")
+    args = parser.parse_args()
+
+    config = Config()
+
+    chunk_size = get_chunk_size(config)
+    input_file = args.input_file or find_input_file(config)
+
+    if is_nwb_file(input_file):
+        # reject the BDF only modes up front rather than silently writing every chunk to the local disk
+        assert not (args.probe or args.shard_plan or args.merge_shards or args.shard is not None), "Only BDF / EDF files support probing and sharding"
+        assert config.SHARD_CHANNEL_COUNT * config.SHARD_TIME_COUNT == 1 and config.SHARD_INDEX is None, "Only BDF / EDF files support sharded conversions"
+        assert not (args.follow or config.FOLLOW_ENABLED), "Only BDF / EDF files support following a recording"
+        assert not config.STREAMING_UPLOAD, "Only BDF / EDF files support streaming upload"
+
+        convert_nwb(input_file, config, chunk_size)
+        if config.IMPORTER_ENABLED:
+            import_output(config, config.OUTPUT_DIR)
+        raise SystemExit(0)
+
+    if args.probe:
+        print(json.dumps(probe(input_file, config, chunk_size), indent=2))
+        raise SystemExit(0)
+
+    if args.shard_plan:
+        print(json.dumps([shard.as_dict() for shard in plan(input_file, config, chunk_size)], indent=2))
+        raise SystemExit(0)
+
+    shard_index = args.shard if args.shard is not None else config.SHARD_INDEX
+    if shard_index is not None:
+        # a single shard worker, the outputs are imported by the merging worker
+        convert(input_file, config, chunk_size, plan(input_file, config, chunk_size)[shard_index])
+        raise SystemExit(0)
 
-    with pyedflib.EdfReader(input_files[0]) as edf:
+    if args.follow or config.FOLLOW_ENABLED:
+        assert config.SHARD_CHANNEL_COUNT * config.SHARD_TIME_COUNT == 1 and not args.merge_shards, "Following a recording does not support sharded conversions"
+        assert not config.STREAMING_UPLOAD or config.IMPORTER_ENABLED, "Streaming upload requires the importer to be enabled"
+        assert not config.STREAMING_UPLOAD or config.OUTPUT_FORMAT == 'float64', "Streaming upload only supports 64-bit floating point chunks"
 
-        start_datetime = edf.getStartdatetime()
+        follow(input_file, config, chunk_size)
+        raise SystemExit(0)
 
-        # Stop timezone warning. Explicity set tz to UTC
-        session_start_time = start_datetime.replace(tzinfo=timezone.utc)
+    if config.STREAMING_UPLOAD:
+        assert config.IMPORTER_ENABLED, "Streaming upload requires the importer to be enabled"
+        assert config.SHARD_CHANNEL_COUNT * config.SHARD_TIME_COUNT == 1 and not args.merge_shards, "Streaming upload does not support sharded conversions"
 
-        reader = BDFElectricalSeriesReader(edf, session_start_time)
+        convert_and_upload(input_file, config, chunk_size)
+        raise SystemExit(0)
 
-        chunked_writer = TimeSeriesChunkWriter(session_start_time, config.OUTPUT_DIR, chunk_size)
-        chunked_writer.write_electrical_series(reader)
+    if args.merge_shards:
+        from sharding import merge_shards
+        merge_shards(config.OUTPUT_DIR, plan(input_file, config, chunk_size))
+    elif config.SHARD_CHANNEL_COUNT * config.SHARD_TIME_COUNT > 1:
+        from sharding import merge_shards
+        shards = convert_local_shards(input_file, config, chunk_size)
+        merge_shards(config.OUTPUT_DIR, shards)
+    else:
+        convert(input_file, config, chunk_size)
 
     # import requires Pennsieve API access; when developing locally this is most often not required
     # note: this will be moved to a separated post-processor once the analysis pipeline is more
     # easily able to handle > 3 processors
     if config.IMPORTER_ENABLED:
-        importer = import_timeseries(config.API_HOST, config.API_HOST2, config.API_KEY, config.API_SECRET, config.WORKFLOW_INSTANCE_ID, config.OUTPUT_DIR)
+        import_output(config, config.OUTPUT_DIR)
@@ -0,0 +1,103 @@
+import logging
+import os
+import re
+
+from concurrent.futures import ThreadPoolExecutor
+
+from pynwb import NWBHDF5IO, ProcessingModule
+from pynwb.ecephys import ElectricalSeries
+
+from reader import NWBElectricalSeriesReader
+
+log = logging.getLogger()
+
+def find_electrical_series(nwbfile):
+    """
+    Returns the (path, ElectricalSeries) of every electrical series in the file (e.g. raw acquisitions of
+    several probes and their LFP in processing modules), found in a single pass over the file's objects
+    and ordered by their path within the file
+    """
+    electrical_series = [
+        (series_path(container), container)
+        for container in nwbfile.objects.values()
+        if isinstance(container, ElectricalSeries)
+    ]
+
+    return sorted(electrical_series, key=lambda series: series[0])
+
+def series_path(container):
+    """
+    Returns the path of a container within its file e.g. processing/ecephys/LFP/ElectricalSeries
+    """
+    names = []
+    while container.parent is not None:
+        child = container
+        names.append(container.name)
+        container = container.parent
+
+    # the containers directly within the file are either processing modules or acquired data
+    if isinstance(child, ProcessingModule):
+        names.append('processing')
+    elif child.name in container.acquisition:
+        names.append('acquisition')
+
+    return '/'.join(reversed(names))
+
+class NWBFileDriver:
+    """
+    Converts every ElectricalSeries of a NWB file, opening (and scanning) the file once.
+
+    Series are written concurrently, each by its own writer into its own sub-directory of the output directory,
+    all sharing a single memory governor (read budget). The channels of each series are offset by the channels
+    of the series before it (in path order), so channel indices are disjoint and stable across the series
+    of a file and the chunk files of all series can be imported together.
+
+    Attributes:
+        file_path (str): path to the NWB file
+        output_dir (str): path to output directory, holding a sub-directory per series
+    """
+    def __init__(self, file_path, output_dir):
+        self.file_path = file_path
+        self.output_dir = output_dir
+
+    def write(self, create_writer):
+        """
+        Converts all series of the file, create_writer(session_start_time, output_dir) returns the writer of a series
+        """
+        with NWBHDF5IO(self.file_path, mode='r', load_namespaces=True) as io:
+            nwbfile = io.read()
+            session_start_time = nwbfile.session_start_time
+
+            readers = []
+            channel_offset = 0
+            for path, electrical_series in find_electrical_series(nwbfile):
+                reader = NWBElectricalSeriesReader(electrical_series, session_start_time, channel_offset=channel_offset)
+                readers.append((path, reader))
+                channel_offset += reader.num_channels
+
+            if not readers:
+                log.info(f"no electrical series found in {self.file_path}")
+                return
+
+            log.info(f"found {len(readers)} electrical series with {channel_offset} channels: " + ", ".join(f"{path} ({reader.num_channels} @ {reader.sampling_rate}Hz)" for path, reader in readers))
+
+            writers = []
+            for path, _ in readers:
+                series_dir = os.path.join(self.output_dir, self.series_dir_name(path))
+                os.makedirs(series_dir, exist_ok=True)
+                writers.append(create_writer(session_start_time, series_dir))
+
+            governor = writers[0].memory_governor(*(reader for _, reader in readers))
+
+            with ThreadPoolExecutor(max_workers=len(readers)) as executor:
+                futures = [
+                    executor.submit(writer.write_electrical_series, reader, governor)
+                    for writer, (_, reader) in zip(writers, readers)
+                ]
+                # waits for all series and raises the first failure
+                for future in futures:
+                    future.result()
+
+    @staticmethod
+    def series_dir_name(path):
+        return re.sub(r'[^\w.-]+', '-', path)
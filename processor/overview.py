@@ -0,0 +1,288 @@
+import gzip
+import json
+import logging
+import numpy as np
+import os
+
+from constants import TIME_SERIES_OVERVIEW_FILE_EXTENSION, TIME_SERIES_OVERVIEW_METADATA_FILE_EXTENSION
+from utils import to_big_endian
+
+log = logging.getLogger()
+
+class OverviewPyramid:
+    """
+    Builds decimated min/max envelope levels ("overviews") of each channel
+    incrementally from the chunks passed through the writer.
+
+    Each level reduces the previous one (the first level reduces the raw samples),
+    so every factor must be a multiple of the factor before it e.g. (10, 100, 1000).
+
+    Envelopes are written per contiguous segment as gzipped big-endian 64-bit
+    (min, max) pairs and are appended to as blocks complete, so only the
+    unflushed tail of each level is held in memory.
+
+    Blocks are aligned to multiples of each factor from the first sample of the recording,
+    so a segment starting within a block (e.g. of a time shard) starts with a partial point,
+    combined with the trailing partial point of the segment before it when merged (see merge).
+
+    Attributes:
+        output_dir (str): path to output directory for the overview files
+        factors (list[int]): decimation factor (number of raw samples per envelope point) of each level
+        flush_size (int): number of pending envelope points per level held in memory before appending to disk
+    """
+
+    def __init__(self, output_dir, factors, flush_size):
+        self.output_dir = output_dir
+        self.factors = sorted(factors)
+        self.flush_size = flush_size
+
+        assert len(self.factors) > 0 and self.factors[0] > 1, "Overview factors must be greater than 1"
+        for lower, upper in zip(self.factors, self.factors[1:]):
+            assert upper % lower == 0, f"Overview factor {upper} is not a multiple of {lower}"
+
+        # per-level reduction step relative to the level below it
+        self.steps = [self.factors[0]] + [upper // lower for lower, upper in zip(self.factors, self.factors[1:])]
+
+        self._segments = {}
+        self._levels = {}
+
+    def resident_bytes(self, num_channels):
+        """
+        Returns an upper bound of the memory (in bytes) held by the pending envelope points and carried over samples of all channels
+        """
+        bytes_per_point = 2 * 8
+
+        return num_channels * sum(self.flush_size * bytes_per_point + step * bytes_per_point for step in self.steps)
+
+    def start_segment(self, channel, start_time, end_time, first_sample=0, num_samples=0):
+        """
+        Starts a new contiguous segment for the given channel, of num_samples samples
+        starting at sample index first_sample of the recording.
+
+        Any envelope points of a previous segment are flushed first
+        as a gap in the data must never be spanned by a single point.
+        """
+        if channel.index in self._levels:
+            self.end_segment(channel)
+
+        start, end = int(start_time * 1e6), int(end_time * 1e6)
+
+        self._levels[channel.index] = [
+            {
+                'factor': factor,
+                'step': step,
+                # points of the level below completing the segment's first block (0 when the segment starts a block)
+                'head': -(first_sample // (factor // step)) % step,
+                'remainder': (np.empty(0), np.empty(0)),
+                'pending': [],
+                'pending_size': 0,
+                'file_path': os.path.join(self.output_dir, self._file_name(channel.index, factor, start, end)),
+                'count': 0,
+            }
+            for factor, step in zip(self.factors, self.steps)
+        ]
+
+        # overview files are appended to, so never extend the output of a previous run
+        for level in self._levels[channel.index]:
+            if os.path.exists(level['file_path']):
+                os.remove(level['file_path'])
+
+        self._segments.setdefault(channel.index, []).append({
+            'start':        start,
+            'end':          end,
+            'first_sample': first_sample,
+            'num_samples':  num_samples,
+        })
+
+    def update(self, channel, chunk):
+        """
+        Reduces the chunk into every level of the given channel's current segment.
+
+        Samples which do not fill a complete block are carried over to the next chunk.
+        """
+        mins = maxs = np.asarray(chunk, dtype=np.float64)
+
+        for level in self._levels[channel.index]:
+            mins, maxs = self._reduce(level, mins, maxs, final=False)
+            if len(mins) == 0:
+                break
+
+    def end_segment(self, channel):
+        """
+        Flushes the partially filled trailing block of every level and
+        appends all pending envelope points of the channel's current segment to disk.
+        """
+        levels = self._levels.pop(channel.index, None)
+        if levels is None:
+            return
+
+        mins = maxs = np.empty(0)
+        for level in levels:
+            mins, maxs = self._reduce(level, mins, maxs, final=True)
+            self._flush(level)
+
+        self._segments[channel.index][-1]['levels'] = [
+            {
+                'factor': level['factor'],
+                'file':   os.path.basename(level['file_path']),
+                'count':  level['count'],
+            }
+            for level in levels
+        ]
+
+    def write_metadata(self, channel):
+        """
+        Writes the overview metadata for the given channel.
+
+        Lists the decimated rate of each level and the files making up each contiguous segment.
+        """
+        self.end_segment(channel)
+
+        file_name = f'channel-{channel.index:05d}{TIME_SERIES_OVERVIEW_METADATA_FILE_EXTENSION}'
+        file_path = os.path.join(self.output_dir, file_name)
+
+        metadata = {
+            'channel': channel.as_dict(),
+            'levels': [{'factor': factor, 'rate': channel.rate / factor} for factor in self.factors],
+            'format': 'interleaved min/max 64-bit floating point big-endian',
+            'segments': self._segments.pop(channel.index, []),
+        }
+
+        with open(file_path, 'w') as file:
+            json.dump(metadata, file)
+
+    def _reduce(self, level, mins, maxs, final):
+        remainder_mins, remainder_maxs = level['remainder']
+        mins = np.concatenate((remainder_mins, mins))
+        maxs = np.concatenate((remainder_maxs, maxs))
+
+        head = level['head']
+        if 0 < head and len(mins) < head and not final:
+            # the segment's first (partial) block is still incomplete
+            level['remainder'] = (mins.copy(), maxs.copy())
+            return np.empty(0), np.empty(0)
+
+        head_mins, head_maxs = np.empty(0), np.empty(0)
+        if 0 < head <= len(mins):
+            head_mins, head_maxs = np.fmin.reduce(mins[:head], keepdims=True), np.fmax.reduce(maxs[:head], keepdims=True)
+            mins, maxs = mins[head:], maxs[head:]
+        level['head'] = 0
+
+        step = level['step']
+        complete = (len(mins) // step) * step
+
+        # fmin / fmax ignore NaN samples unless the whole block is NaN
+        block_mins = np.concatenate((head_mins, np.fmin.reduce(mins[:complete].reshape(-1, step), axis=1)))
+        block_maxs = np.concatenate((head_maxs, np.fmax.reduce(maxs[:complete].reshape(-1, step), axis=1)))
+
+        if final and complete < len(mins):
+            block_mins = np.append(block_mins, np.fmin.reduce(mins[complete:]))
+            block_maxs = np.append(block_maxs, np.fmax.reduce(maxs[complete:]))
+            level['remainder'] = (np.empty(0), np.empty(0))
+        else:
+            # copy to release the (potentially large) concatenated input
+            level['remainder'] = (mins[complete:].copy(), maxs[complete:].copy())
+
+        if len(block_mins) > 0:
+            level['pending'].append(np.column_stack((block_mins, block_maxs)).ravel())
+            level['pending_size'] += len(block_mins)
+            level['count'] += len(block_mins)
+
+            if level['pending_size'] >= self.flush_size:
+                self._flush(level)
+
+        return block_mins, block_maxs
+
+    def _flush(self, level):
+        if not level['pending']:
+            return
+
+        formatted_data = to_big_endian(np.concatenate(level['pending']).astype(np.float64))
+
+        # appending creates a multi-member gzip file which decompresses as a single stream
+        with gzip.open(level['file_path'], 'ab') as f:
+            f.write(formatted_data)
+
+        level['pending'] = []
+        level['pending_size'] = 0
+
+    @staticmethod
+    def merge(output_dir, file_paths, channel=None):
+        """
+        Combines the overview metadata at the given paths of a single channel (e.g. of the time shards of a conversion)
+        and their level files into the output directory, describing the given (merged) channel if any.
+
+        Segments of consecutive samples are joined into a single segment, the point of a block split
+        between two segments is reduced from the partial points of both.
+        """
+        segments = []
+        for file_path in file_paths:
+            with open(file_path, 'r') as file:
+                metadata = json.load(file)
+            segments.extend((segment, os.path.dirname(file_path)) for segment in metadata['segments'])
+
+        segments.sort(key=lambda segment: segment[0]['first_sample'])
+
+        runs = []
+        for segment, directory in segments:
+            if runs and runs[-1][-1][0]['first_sample'] + runs[-1][-1][0]['num_samples'] == segment['first_sample']:
+                runs[-1].append((segment, directory))
+            else:
+                runs.append([(segment, directory)])
+
+        channel_index = int(os.path.basename(file_paths[0])[len('channel-'):].split('.')[0])
+        metadata['segments'] = [OverviewPyramid._merge_segments(output_dir, channel_index, run) for run in runs]
+        if channel is not None:
+            metadata['channel'] = channel.as_dict()
+
+        with open(os.path.join(output_dir, os.path.basename(file_paths[0])), 'w') as file:
+            json.dump(metadata, file)
+
+    @staticmethod
+    def _merge_segments(output_dir, channel_index, run):
+        first, last = run[0][0], run[-1][0]
+        merged = {
+            'start':        first['start'],
+            'end':          last['end'],
+            'first_sample': first['first_sample'],
+            'num_samples':  sum(segment['num_samples'] for segment, _ in run),
+            'levels':       [],
+        }
+
+        for level_index, level in enumerate(first['levels']):
+            factor = level['factor']
+            file_name = OverviewPyramid._file_name(channel_index, factor, merged['start'], merged['end'])
+            merged['levels'].append({'factor': factor, 'file': file_name, 'count': sum(segment['levels'][level_index]['count'] for segment, _ in run)})
+
+            if len(run) == 1:
+                os.replace(os.path.join(run[0][1], level['file']), os.path.join(output_dir, file_name))
+                continue
+
+            with gzip.open(os.path.join(output_dir, file_name), 'wb') as merged_file:
+                # the last point of a segment is held back, it is combined with the next segment's first point when they share a block
+                last_point = None
+                for segment, directory in run:
+                    with gzip.open(os.path.join(directory, segment['levels'][level_index]['file']), 'rb') as f:
+                        data = f.read()
+                    points = np.frombuffer(data, dtype='>f8').reshape(-1, 2)
+                    if len(points) == 0:
+                        continue
+
+                    if last_point is not None and segment['first_sample'] % factor != 0:
+                        points = points.copy()
+                        points[0] = (np.fmin(last_point[0], points[0, 0]), np.fmax(last_point[1], points[0, 1]))
+                        merged['levels'][-1]['count'] -= 1
+                    elif last_point is not None:
+                        merged_file.write(last_point.tobytes())
+
+                    merged_file.write(points[:-1].tobytes())
+                    last_point = points[-1]
+
+                if last_point is not None:
+                    merged_file.write(last_point.tobytes())
+
+        return merged
+
+    @staticmethod
+    def _file_name(channel_index, factor, start, end):
+        return "channel-{:05d}_{}_{}_x{}{}".format(channel_index, start, end, factor, TIME_SERIES_OVERVIEW_FILE_EXTENSION)
@@ -21,15 +21,17 @@ class NWBElectricalSeriesReader:
         sampling_rate (int): Sampling rate (in Hz) either given by the raw file or calculated from given timestamp values
         timestamps (int): Timestamps (offset seconds from 0) either given by the raw file or calculated from given sampling rate
         channels (list[TimeSeriesChannel]): list of channels and their respective metadata
+        channel_offset (int): index of the series' first channel, keeping the channel indices of several series in a file disjoint
     """
 
-    def __init__(self, electrical_series, session_start_time):
+    def __init__(self, electrical_series, session_start_time, channel_offset=0):
         self.electrical_series = electrical_series
         self.session_start_time_secs = session_start_time.timestamp()
+        self.channel_offset = channel_offset
         self.num_samples, self.num_channels = self.electrical_series.data.shape
 
         assert self.num_samples > 0, 'Electrical series has no sample data'
-        assert len(self.electrical_series.electrodes.table) == self.num_channels, 'Electrode channels do not align with data shape'
+        assert len(self.electrical_series.electrodes) == self.num_channels, 'Electrode channels do not align with data shape'
 
         self._sampling_rate = None
         self._timestamps = None
@@ -59,7 +61,7 @@ class NWBElectricalSeriesReader:
         # if both the timestamps and rate properties are set on the electrical series
         # validate that the given rate is within a 2% margin of the rate calculated
         # off of the given timestamps
-        if self.electrical_series.rate and self.electrical_series.timestamps:
+        if self.electrical_series.rate and self.electrical_series.timestamps is not None:
             # validate sampling rate against timestamps
             timestamps = self.electrical_series.timestamps
             sampling_rate = self.electrical_series.rate
@@ -78,9 +80,9 @@ class NWBElectricalSeriesReader:
             timestamps = np.linspace(0, self.num_samples / sampling_rate, self.num_samples, endpoint = False)
 
         # if only the timestamps are given, calculate the sampling rate using the timestamps
-        if self.electrical_series.timestamps:
-            timestamps = self.electrical_series.timestamps
-            sampling_rate = round(infer_sampling_rate(self._timestamps))
+        if self.electrical_series.timestamps is not None:
+            timestamps = self.electrical_series.timestamps[:]
+            sampling_rate = round(infer_sampling_rate(timestamps))
 
         self._sampling_rate = sampling_rate
         self._timestamps = timestamps + self.session_start_time_secs
@@ -115,7 +117,7 @@ class NWBElectricalSeriesReader:
                 channels.append(
                         # convert start / end to microseconds to maintain precision
                         TimeSeriesChannel(
-                            index = index,
+                            index = self.channel_offset + index,
                             name = name,
                             rate = self.sampling_rate,
                             start = self.timestamps[0] * 1e6 , # safe access gaurenteed by initialization assertions
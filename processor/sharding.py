@@ -0,0 +1,175 @@
+import json
+import logging
+import os
+import shutil
+
+from constants import TIME_SERIES_CHANNEL_TABLE_FILE_NAME, TIME_SERIES_ENCODING_FILE_EXTENSION
+from constants import TIME_SERIES_OVERVIEW_FILE_EXTENSION, TIME_SERIES_OVERVIEW_METADATA_FILE_EXTENSION, TIME_SERIES_STATS_FILE_NAME
+from constants import TIME_SERIES_SHARD_MANIFEST_FILE_NAME
+
+log = logging.getLogger()
+
+"""
+Splits the conversion of a single file into (channel range x record range) shards, each
+converted by a separate process or container into its own directory using the regular
+chunk file naming scheme, and merges the outputs of all shards for a single import.
+
+The split is derived from the file's header only, so every worker computes the same plan.
+"""
+
+class Shard:
+    """
+    Attributes:
+        index (int): index of the shard in the plan
+        channel_start (int): first channel index of the shard
+        channel_end (int): channel index after the last channel of the shard
+        record_start (int): first data record of the shard
+        record_end (int): data record after the last data record of the shard
+    """
+    def __init__(self, index, channel_start, channel_end, record_start, record_end):
+        self.index = index
+        self.channel_start = channel_start
+        self.channel_end = channel_end
+        self.record_start = record_start
+        self.record_end = record_end
+
+    @property
+    def name(self):
+        return f'shard-{self.index:04d}'
+
+    def output_dir(self, output_dir):
+        return os.path.join(output_dir, self.name)
+
+    def as_dict(self):
+        return {
+            'index':         self.index,
+            'channel_start': self.channel_start,
+            'channel_end':   self.channel_end,
+            'record_start':  self.record_start,
+            'record_end':    self.record_end,
+        }
+
+    @staticmethod
+    def from_dict(shard):
+        return Shard(
+            index =         int(shard['index']),
+            channel_start = int(shard['channel_start']),
+            channel_end =   int(shard['channel_end']),
+            record_start =  int(shard['record_start']),
+            record_end =    int(shard['record_end']),
+        )
+
+    def __eq__(self, other):
+        return self.as_dict() == other.as_dict()
+
+    def __repr__(self):
+        return f"Shard({', '.join(f'{key}={value}' for key, value in self.as_dict().items())})"
+
+def plan_shards(header, channel_shards, time_shards, chunk_size):
+    """
+    Deterministically splits a file into channel_shards x time_shards shards using only its header.
+
+    Channels are split into contiguous ranges of (about) equal size, data records into ranges
+    of whole chunk windows, which span the same data records for all channels (see BDFHeader.records_per_chunk),
+    so every channel is chunked exactly as it would be by a single (unsharded) conversion.
+    Fewer time shards are planned when the file holds fewer chunk windows.
+
+    This only holds when every shard is converted with the given chunk size, shard workers keep it
+    rather than letting their memory governor shrink it (the plan's chunk size must fit their budget).
+    """
+    num_channels = len(header.data_signals)
+    channel_shards = max(1, min(channel_shards, num_channels))
+
+    window_records = header.records_per_chunk(chunk_size)
+    num_windows = -(-header.num_records // window_records)
+    time_shards = max(1, min(time_shards, num_windows))
+
+    channel_bounds = [round(i * num_channels / channel_shards) for i in range(channel_shards + 1)]
+    record_bounds = [min(header.num_records, round(i * num_windows / time_shards) * window_records) for i in range(time_shards + 1)]
+
+    shards = []
+    for channel_start, channel_end in zip(channel_bounds, channel_bounds[1:]):
+        for record_start, record_end in zip(record_bounds, record_bounds[1:]):
+            shards.append(Shard(len(shards), channel_start, channel_end, record_start, record_end))
+
+    return shards
+
+def write_shard_manifest(output_dir, shard):
+    """
+    Marks a shard as complete, listing the files it produced
+    """
+    shard_dir = shard.output_dir(output_dir)
+    files = sorted(
+        entry.name
+        for entry in os.scandir(shard_dir)
+        if entry.is_file() and not entry.name.startswith('.') and entry.name != TIME_SERIES_SHARD_MANIFEST_FILE_NAME
+    )
+
+    with open(os.path.join(shard_dir, TIME_SERIES_SHARD_MANIFEST_FILE_NAME), 'w') as file:
+        json.dump({'shard': shard.as_dict(), 'files': files}, file)
+
+def merge_shards(output_dir, shards):
+    """
+    Merges the outputs of all (completed) shards into the output directory:
+        - chunk files are moved as is (their names never collide across shards)
+        - the channel tables of all shards are merged, each channel spanning the start / end of all its shards
+        - the overviews of a channel's shards are joined into a single segment (see OverviewPyramid.merge)
+        - the statistics indexes of all shards are combined
+    """
+    from overview import OverviewPyramid
+    from stats import ChunkStatsIndex
+    from timeseries_channel import ChannelTable
+
+    manifests = []
+    for shard in shards:
+        manifest_path = os.path.join(shard.output_dir(output_dir), TIME_SERIES_SHARD_MANIFEST_FILE_NAME)
+        assert os.path.exists(manifest_path), f"{shard.name} has not completed"
+
+        with open(manifest_path, 'r') as file:
+            manifest = json.load(file)
+        assert Shard.from_dict(manifest['shard']) == shard, f"{shard.name} was converted with a different shard plan"
+        manifests.append((shard, manifest))
+
+    channel_tables = []
+    encodings = {}
+    overviews = {}
+    stats_files = []
+
+    for shard, manifest in manifests:
+        shard_dir = shard.output_dir(output_dir)
+
+        for file_name in manifest['files']:
+            file_path = os.path.join(shard_dir, file_name)
+
+            if file_name == TIME_SERIES_CHANNEL_TABLE_FILE_NAME:
+                channel_tables.append(ChannelTable.read(file_path))
+            elif file_name.endswith(TIME_SERIES_ENCODING_FILE_EXTENSION):
+                with open(file_path, 'r') as file:
+                    encodings[file_name] = json.load(file)
+            elif file_name.endswith(TIME_SERIES_OVERVIEW_METADATA_FILE_EXTENSION):
+                overviews.setdefault(file_name, []).append(file_path)
+            elif file_name.endswith(TIME_SERIES_OVERVIEW_FILE_EXTENSION):
+                # level files are merged along with their metadata
+                continue
+            elif file_name == TIME_SERIES_STATS_FILE_NAME:
+                stats_files.append(file_path)
+            else:
+                os.replace(file_path, os.path.join(output_dir, file_name))
+
+    channels = ChannelTable.merge(channel_tables)
+    channels.write(os.path.join(output_dir, TIME_SERIES_CHANNEL_TABLE_FILE_NAME))
+
+    for file_name, encoding in encodings.items():
+        with open(os.path.join(output_dir, file_name), 'w') as file:
+            json.dump(encoding, file)
+
+    for file_name, file_paths in overviews.items():
+        OverviewPyramid.merge(output_dir, file_paths, channels.find(int(file_name[len('channel-'):].split('.')[0])))
+
+    if stats_files:
+        ChunkStatsIndex.merge(output_dir, stats_files)
+
+    for shard, _ in manifests:
+        shutil.rmtree(shard.output_dir(output_dir))
+
+    log.info(f"merged {len(manifests)} shards into {output_dir}")
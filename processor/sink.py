@@ -0,0 +1,134 @@
+import gzip
+import logging
+import os
+import threading
+
+log = logging.getLogger()
+
+BYTES_PER_MB = pow(2, 20)
+
+"""
+Destinations of the (formatted) chunk sample data written by the TimeSeriesChunkWriter:
+gzipped chunk files in the output directory, or compressed in memory and uploaded directly
+to the import without writing the chunk files.
+"""
+
+class DiskChunkSink:
+    """
+    Writes each chunk to a gzipped file in the output directory, under a temporary name
+    renamed once complete so a partially written chunk is never mistaken for a complete one
+
+    Attributes:
+        output_dir (str): path to output directory for chunked sample data binary files
+        resident_bytes (int): memory held by the sink besides the chunks in flight
+    """
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.resident_bytes = 0
+
+    def write(self, file_name, data):
+        file_path = os.path.join(self.output_dir, file_name)
+
+        with gzip.open(file_path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(file_path + '.tmp', file_path)
+
+class UploadChunkSink:
+    """
+    Compresses each chunk in memory and uploads it straight to its pre-signed URL,
+    so the chunk files are never written to (or read back from) the local disk.
+
+    The chunks held while compressing and uploading are bounded by an in-flight byte budget, writers block
+    while it is exhausted. A chunk reserves its uncompressed size before it is compressed, reduced to the
+    compressed size once known. A chunk whose upload fails is spilled to its local path, releasing its share
+    of the budget, and retried from the disk; the spilled file is removed once uploaded.
+
+    The chunk files of the conversion must be known up front, the sink is opened with the import initialized for them.
+
+    Attributes:
+        max_in_flight_bytes (int): budget of compressed bytes held in memory while uploading
+        resident_bytes (int): memory held by the sink besides the chunks in flight
+        timeseries_import (TimeSeriesImport): import the chunks are uploaded to, set when opened
+    """
+    def __init__(self, max_in_flight_mb):
+        self.max_in_flight_bytes = int(max_in_flight_mb * BYTES_PER_MB)
+        self.resident_bytes = self.max_in_flight_bytes
+        self.timeseries_import = None
+
+        self._in_flight_bytes = 0
+        self._condition = threading.Condition()
+
+        self._spilled = 0
+        self._lock = threading.Lock()
+
+    def open(self, timeseries_import):
+        self.timeseries_import = timeseries_import
+
+    def write(self, file_name, data):
+        assert self.timeseries_import is not None, "Upload sink has not been opened with an import"
+        assert file_name in self.timeseries_import.files, f"{file_name} is not part of the import"
+
+        # compressed as raw bytes, the gzip trailer holds the length of the data which is not the length of e.g. an array
+        data = memoryview(data).cast('B')
+
+        size = data.nbytes
+        self._acquire(size)
+        try:
+            compressed = gzip.compress(data)
+            size = self._adjust(size, len(compressed))
+            try:
+                self.timeseries_import.upload(file_name, compressed)
+                return
+            except Exception as e:
+                log.warning(f"failed to upload {file_name} from memory, spilling to disk for retry: %s", e)
+                self._spill(file_name, compressed)
+        finally:
+            compressed = None
+            self._release(size)
+
+        self.timeseries_import.upload_file(file_name)
+        os.remove(self.timeseries_import.files[file_name].local_path)
+
+    def close(self):
+        """
+        Verifies every file of the import has been uploaded
+        """
+        if self._spilled > 0:
+            log.info(f"import_id={self.timeseries_import.import_id} {self._spilled} time series files were retried from disk")
+
+        log.info(f"import_id={self.timeseries_import.import_id} uploaded {self.timeseries_import.uploaded} time series files")
+
+        assert self.timeseries_import.uploaded == len(self.timeseries_import.files), "Failed to upload all time series files"
+
+    def _spill(self, file_name, compressed):
+        file_path = self.timeseries_import.files[file_name].local_path
+
+        with open(file_path + '.tmp', 'wb') as f:
+            f.write(compressed)
+        os.replace(file_path + '.tmp', file_path)
+
+        with self._lock:
+            self._spilled += 1
+
+    def _acquire(self, size):
+        with self._condition:
+            # a chunk larger than the whole budget is let through on its own
+            while self._in_flight_bytes > 0 and self._in_flight_bytes + size > self.max_in_flight_bytes:
+                self._condition.wait()
+
+            self._in_flight_bytes += size
+
+    def _adjust(self, reserved, size):
+        """
+        Adjusts a reservation to the actual size of its chunk, without blocking, and returns the size
+        """
+        with self._condition:
+            self._in_flight_bytes += size - reserved
+            self._condition.notify_all()
+
+        return size
+
+    def _release(self, size):
+        with self._condition:
+            self._in_flight_bytes -= size
+            self._condition.notify_all()
@@ -0,0 +1,135 @@
+import logging
+import numpy as np
+import os
+
+from constants import TIME_SERIES_STATS_FILE_NAME
+
+log = logging.getLogger()
+
+STATS_COLUMNS = ('min', 'max', 'mean', 'rms', 'nan_count', 'flatline')
+
+def chunk_statistics(chunk):
+    """
+    Returns the (min, max, mean, rms, nan_count, flatline) statistics of a chunk.
+
+    NaN samples are excluded from all but the nan_count statistic, a chunk
+    consisting only of NaN samples has NaN min / max / mean / rms values.
+
+    A chunk is flagged as a flatline when all of its (non-NaN) samples are equal.
+    """
+    chunk = np.asarray(chunk, dtype=np.float64)
+
+    nan_mask = np.isnan(chunk)
+    nan_count = int(np.count_nonzero(nan_mask))
+
+    if nan_count == len(chunk):
+        return np.nan, np.nan, np.nan, np.nan, nan_count, nan_count > 0
+
+    values = chunk[~nan_mask] if nan_count > 0 else chunk
+
+    minimum = values.min()
+    maximum = values.max()
+
+    return minimum, maximum, values.mean(), np.sqrt(np.dot(values, values) / len(values)), nan_count, bool(minimum == maximum)
+
+class ChunkStatsIndex:
+    """
+    Columnar index of per-chunk statistics, keyed by channel index and the chunk's start / end (in microseconds).
+
+    The index is written as a single sidecar file (numpy .npz archive) to the output directory
+    so downstream quality control can select chunks by their statistics without decompressing them.
+
+    Attributes:
+        output_dir (str): path to output directory for the index file
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+
+        self._rows = []
+
+    def add(self, channel, start_time, end_time, chunk):
+        """
+        Computes and records the statistics of the given chunk.
+
+        start_time and end_time are given in seconds, matching the chunk file name.
+        """
+        statistics = chunk_statistics(chunk)
+        self.add_statistics(channel, start_time, end_time, len(chunk), statistics)
+
+        return statistics
+
+    def add_statistics(self, channel, start_time, end_time, count, statistics):
+        """
+        Records previously computed statistics e.g. of a chunk written by an earlier (resumed) run
+        """
+        self._rows.append((channel.index, int(start_time * 1e6), int(end_time * 1e6), count) + tuple(statistics))
+
+    def write(self):
+        file_path = os.path.join(self.output_dir, TIME_SERIES_STATS_FILE_NAME)
+
+        rows = list(zip(*self._rows)) if self._rows else [()] * (4 + len(STATS_COLUMNS))
+        channel, start, end, count, minimum, maximum, mean, rms, nan_count, flatline = rows
+
+        self._save(
+            file_path,
+            dict(
+                channel   = np.array(channel, dtype=np.int32),
+                start     = np.array(start, dtype=np.int64),
+                end       = np.array(end, dtype=np.int64),
+                count     = np.array(count, dtype=np.int64),
+                min       = np.array(minimum, dtype=np.float64),
+                max       = np.array(maximum, dtype=np.float64),
+                mean      = np.array(mean, dtype=np.float64),
+                rms       = np.array(rms, dtype=np.float64),
+                nan_count = np.array(nan_count, dtype=np.int64),
+                flatline  = np.array(flatline, dtype=bool),
+            )
+        )
+
+        log.info(f"wrote statistics of {len(self._rows)} chunks to {file_path}")
+
+    @staticmethod
+    def merge(output_dir, file_paths):
+        """
+        Combines the statistics indexes at the given paths (e.g. of the shards of a conversion)
+        into a single index in the output directory
+        """
+        indexes = [ChunkStatsIndex.load(file_path) for file_path in file_paths]
+        columns = {column: np.concatenate([index[column] for index in indexes]) for column in indexes[0]}
+
+        ChunkStatsIndex._save(os.path.join(output_dir, TIME_SERIES_STATS_FILE_NAME), columns)
+
+    @staticmethod
+    def _save(file_path, columns):
+        with open(file_path, 'wb') as file:
+            np.savez_compressed(file, **columns)
+
+    @staticmethod
+    def load(file_path):
+        """
+        Loads a statistics index as a dict of equal length column arrays
+        (channel, start, end, count, min, max, mean, rms, nan_count, flatline)
+        """
+        with np.load(file_path) as index:
+            return {column: index[column] for column in index.files}
+
+    @staticmethod
+    def select(index, channel=None, start=None, end=None):
+        """
+        Returns a boolean mask over the rows of a loaded index selecting the chunks
+        of the given channel (index) that overlap the given [start, end] range (in microseconds)
+
+        e.g. clipped chunks of channel 17:
+            mask = ChunkStatsIndex.select(index, channel=17) & (index['max'] >= clip_level)
+        """
+        mask = np.ones(len(index['channel']), dtype=bool)
+
+        if channel is not None:
+            mask &= index['channel'] == channel
+        if start is not None:
+            mask &= index['end'] >= start
+        if end is not None:
+            mask &= index['start'] <= end
+
+        return mask
@@ -0,0 +1,106 @@
+import glob
+import gzip
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# the processor's modules import each other by their flat module names
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# samples per data record (of 1 second) of each signal: mixed rates, none dividing the chunk size
+SAMPLES_PER_RECORD = (200, 100, 256, 200)
+NUM_RECORDS = 520
+CHUNK_SIZE = 1024
+
+def write_bdf(file_path, samples_per_record, num_records, bdf=True, seed=0):
+    """
+    Writes a BDF (24-bit) or EDF (16-bit) file of random digital samples, returning the samples of each signal
+    """
+    rng = np.random.default_rng(seed)
+    num_signals = len(samples_per_record)
+    bytes_per_sample = 3 if bdf else 2
+    digital_max = (1 << (8 * bytes_per_sample - 1)) - 1
+
+    def field(value, width):
+        return str(value).ljust(width)[:width].encode('ascii')
+
+    header = b''.join((
+        b'\xffBIOSEMI' if bdf else field(0, 8),
+        field('patient', 80),
+        field('recording', 80),
+        field('19.10.26', 8),
+        field('19.07.21', 8),
+        field(256 * (num_signals + 1), 8),
+        field('24BIT' if bdf else '', 44),
+        field(num_records, 8),
+        field(1, 8),
+        field(num_signals, 4),
+    ))
+
+    signal_fields = (
+        [field(f'channel {i}', 16) for i in range(num_signals)],
+        [field('', 80)] * num_signals,
+        [field('uV', 8)] * num_signals,
+        [field(-1000 - i, 8) for i in range(num_signals)],
+        [field(1000 + 3 * i, 8) for i in range(num_signals)],
+        [field(-digital_max - 1, 8)] * num_signals,
+        [field(digital_max, 8)] * num_signals,
+        [field('', 80)] * num_signals,
+        [field(samples, 8) for samples in samples_per_record],
+        [field('', 32)] * num_signals,
+    )
+    header += b''.join(b''.join(values) for values in signal_fields)
+
+    signals = [rng.integers(-digital_max - 1, digital_max + 1, size=num_records * samples).astype('<i4') for samples in samples_per_record]
+
+    with open(file_path, 'wb') as file:
+        file.write(header)
+        for record in range(num_records):
+            for signal, samples in zip(signals, samples_per_record):
+                values = signal[record * samples:(record + 1) * samples]
+                file.write(values.view(np.uint8).reshape(-1, 4)[:, :bytes_per_sample].tobytes())
+
+    return signals
+
+def convert(file_path, output_dir, **kwargs):
+    """
+    Converts a whole file with the writer alone (bypassing the configuration of main)
+    """
+    from bdf_header import BDFHeader
+    from bdf_reader import BDFElectricalSeriesReader
+    from writer import TimeSeriesChunkWriter
+
+    header = BDFHeader.read(file_path)
+    os.makedirs(output_dir, exist_ok=True)
+
+    writer = TimeSeriesChunkWriter(header.start_datetime, output_dir, kwargs.pop('chunk_size', CHUNK_SIZE), **kwargs)
+    writer.write_electrical_series(BDFElectricalSeriesReader(header))
+
+def chunk_files(output_dir, extension='.bin.gz'):
+    return sorted(os.path.basename(file_path) for file_path in glob.glob(os.path.join(output_dir, '*' + extension)))
+
+def read_chunk(file_path):
+    with gzip.open(file_path, 'rb') as f:
+        return f.read()
+
+def channel_samples(output_dir, channel_index):
+    """
+    Concatenates the float64 chunks of a channel in order of their start time
+    """
+    names = [name for name in chunk_files(output_dir) if name.startswith(f'channel-{channel_index:05d}_')]
+    names.sort(key=lambda name: int(name.split('_')[1]))
+    return np.concatenate([np.frombuffer(read_chunk(os.path.join(output_dir, name)), dtype='>f8') for name in names])
+
+@pytest.fixture(params=[True, False], ids=['bdf', 'edf'])
+def recording(request, tmp_path):
+    file_path = str(tmp_path / ('recording.bdf' if request.param else 'recording.edf'))
+    write_bdf(file_path, SAMPLES_PER_RECORD, NUM_RECORDS, bdf=request.param)
+    return file_path
+
+@pytest.fixture
+def bdf_recording(tmp_path):
+    file_path = str(tmp_path / 'recording.bdf')
+    write_bdf(file_path, SAMPLES_PER_RECORD, NUM_RECORDS)
+    return file_path
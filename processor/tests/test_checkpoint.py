@@ -0,0 +1,24 @@
+import os
+
+from conftest import chunk_files, convert, read_chunk
+
+def test_resume_rewrites_only_missing_chunks(bdf_recording, tmp_path):
+    output_dir = str(tmp_path / 'output')
+    convert(bdf_recording, output_dir)
+
+    names = chunk_files(output_dir)
+    contents = {name: read_chunk(os.path.join(output_dir, name)) for name in names}
+
+    deleted, truncated = names[3], names[-5]
+    os.remove(os.path.join(output_dir, deleted))
+    with open(os.path.join(output_dir, truncated), 'r+b') as file:
+        file.truncate(os.path.getsize(file.name) // 2)
+
+    modified = {name: os.stat(os.path.join(output_dir, name)).st_mtime_ns for name in names if name not in (deleted, truncated)}
+
+    convert(bdf_recording, output_dir)
+
+    assert chunk_files(output_dir) == names
+    assert all(read_chunk(os.path.join(output_dir, name)) == contents[name] for name in names)
+    # only the deleted and truncated chunks were written again
+    assert all(os.stat(os.path.join(output_dir, name)).st_mtime_ns == mtime for name, mtime in modified.items())
@@ -0,0 +1,25 @@
+import json
+import os
+
+import pytest
+
+from constants import TIME_SERIES_ENCODING_FILE_EXTENSION
+from encoding import ChunkEncoding, verify_chunk_file
+
+from conftest import chunk_files, convert
+
+@pytest.mark.parametrize('output_format, delta_encoding', [('int24', True), ('int24', False), ('int32', True)])
+def test_integer_chunks_verify_against_float_chunks(bdf_recording, tmp_path, output_format, delta_encoding):
+    float_dir = str(tmp_path / 'float64')
+    encoded_dir = str(tmp_path / output_format)
+    convert(bdf_recording, float_dir, overview_factors=None, write_stats=False)
+    convert(bdf_recording, encoded_dir, overview_factors=None, write_stats=False, output_format=output_format, delta_encoding=delta_encoding)
+
+    names = chunk_files(encoded_dir, '.ibin.gz')
+    assert [name.replace('.ibin.gz', '.bin.gz') for name in names] == chunk_files(float_dir)
+
+    for name in names:
+        with open(os.path.join(encoded_dir, name.split('_')[0] + TIME_SERIES_ENCODING_FILE_EXTENSION)) as file:
+            encoding = ChunkEncoding.from_dict(json.load(file))
+        assert encoding.delta == delta_encoding
+        assert verify_chunk_file(os.path.join(encoded_dir, name), os.path.join(float_dir, name.replace('.ibin.gz', '.bin.gz')), encoding)
@@ -0,0 +1,107 @@
+import os
+
+import pytest
+
+from bdf_header import BDFHeader
+from follow import RecordingFollower
+
+from conftest import CHUNK_SIZE, NUM_RECORDS, SAMPLES_PER_RECORD, write_bdf
+
+# records of a chunk window of CHUNK_SIZE samples of the fastest signal (256Hz)
+WINDOW_RECORDS = CHUNK_SIZE // max(SAMPLES_PER_RECORD)
+
+class Recording:
+    """
+    A BDF file being recorded: the complete file's data records are appended to a copy of its header
+    """
+    def __init__(self, complete_path, path):
+        self.path = path
+        with open(complete_path, 'rb') as file:
+            self.data = file.read()
+
+        header = BDFHeader.read(complete_path)
+        self.header_size = header.header_size
+        self.record_size = header.record_size
+
+        self.records = 0
+        with open(self.path, 'wb') as file:
+            file.write(self.data[:self.header_size])
+
+    def append(self, records):
+        start = self.header_size + self.records * self.record_size
+        self.records = min(self.records + records, NUM_RECORDS)
+        with open(self.path, 'ab') as file:
+            file.write(self.data[start:self.header_size + self.records * self.record_size])
+
+@pytest.fixture
+def recording(bdf_recording, tmp_path):
+    return Recording(bdf_recording, str(tmp_path / 'recording.bdf'))
+
+def test_increments_end_on_chunk_windows(recording, tmp_path):
+    follower = RecordingFollower(recording.path, str(tmp_path), CHUNK_SIZE)
+
+    recording.append(WINDOW_RECORDS - 1)
+    header = BDFHeader.read(recording.path)
+    assert follower.next_increment(header) is None
+
+    recording.append(2 * WINDOW_RECORDS)
+    header = BDFHeader.read(recording.path)
+    increment = follower.next_increment(header)
+    assert (increment.index, increment.channel_start, increment.channel_end) == (0, 0, len(SAMPLES_PER_RECORD))
+    assert (increment.record_start, increment.record_end) == (0, 2 * WINDOW_RECORDS)
+    follower.complete(header, increment)
+
+    # the partial window is only taken once the file stops growing
+    assert follower.next_increment(header) is None
+    final = follower.next_increment(header, final=True)
+    assert (final.index, final.record_start, final.record_end) == (1, 2 * WINDOW_RECORDS, 3 * WINDOW_RECORDS - 1)
+
+def test_state_continues_the_same_recording_only(recording, tmp_path):
+    recording.append(3 * WINDOW_RECORDS)
+    header = BDFHeader.read(recording.path)
+
+    follower = RecordingFollower(recording.path, str(tmp_path), CHUNK_SIZE)
+    increment = follower.next_increment(header)
+    follower.complete(header, increment)
+
+    restarted = RecordingFollower(recording.path, str(tmp_path), CHUNK_SIZE)
+    restarted.load(header)
+    assert (restarted.records, restarted.increments, restarted.pending) == (3 * WINDOW_RECORDS, 1, [increment])
+
+    # a recording started at another time is followed from its beginning
+    other_path = str(tmp_path / 'other' / 'recording.bdf')
+    os.makedirs(os.path.dirname(other_path))
+    with open(recording.path, 'rb') as file:
+        data = bytearray(file.read())
+    data[176:184] = b'20.07.21'
+    with open(other_path, 'wb') as file:
+        file.write(data)
+
+    other = RecordingFollower(other_path, str(tmp_path), CHUNK_SIZE)
+    other.load(BDFHeader.read(other_path))
+    assert (other.records, other.increments, other.pending) == (0, 0, [])
+
+def test_run_ingests_the_growing_file_and_merges_its_increments(recording, tmp_path):
+    recording.append(10)
+    follower = RecordingFollower(recording.path, str(tmp_path), CHUNK_SIZE)
+
+    ingested = []
+    merged = []
+
+    def ingest(increment):
+        ingested.append(increment)
+        # the recording grows while an increment is ingested
+        recording.append(37)
+
+    follower.run(ingest, merged.extend, interval=0.01, idle_timeout=0.5)
+
+    assert len(ingested) > 2
+    assert [increment.index for increment in ingested] == list(range(len(ingested)))
+    assert [increment.record_start for increment in ingested] == [0] + [increment.record_end for increment in ingested[:-1]]
+    assert all(increment.record_end % WINDOW_RECORDS == 0 for increment in ingested[:-1])
+    assert ingested[-1].record_end == NUM_RECORDS
+
+    assert merged == ingested
+    restarted = RecordingFollower(recording.path, str(tmp_path), CHUNK_SIZE)
+    restarted.load(BDFHeader.read(recording.path))
+    assert (restarted.records, restarted.pending) == (NUM_RECORDS, [])
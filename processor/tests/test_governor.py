@@ -0,0 +1,77 @@
+import threading
+
+import pytest
+
+import governor
+from governor import CHUNK_COPIES, BYTES_PER_MB, MIN_CHUNK_SIZE, MemoryGovernor
+
+CHUNK_SIZE = 131072
+
+@pytest.fixture
+def rss(monkeypatch):
+    """
+    Sets the resident set size seen by the governor (in MB)
+    """
+    usage = {'mb': 0}
+    monkeypatch.setattr(governor, 'current_rss', lambda: usage['mb'] * BYTES_PER_MB)
+    return usage
+
+def test_window_fits_the_budget(rss):
+    # 64MB fit many chunks in flight, the window is kept
+    unconstrained = MemoryGovernor(64, 4, CHUNK_SIZE * 4, CHUNK_SIZE)
+    assert unconstrained.chunk_size == CHUNK_SIZE
+    assert unconstrained.queue_depth >= unconstrained.workers >= 1
+
+    # decode buffers of 256 channels (4 bytes per sample each) do not fit a window of CHUNK_SIZE samples
+    buffer_bytes_per_sample = 256 * 4
+    constrained = MemoryGovernor(64, 256, CHUNK_SIZE * 256, CHUNK_SIZE, buffer_bytes_per_sample=buffer_bytes_per_sample)
+    assert MIN_CHUNK_SIZE <= constrained.chunk_size < CHUNK_SIZE
+    assert constrained.chunk_size * (buffer_bytes_per_sample + 2 * 8 * CHUNK_COPIES) <= 64 * BYTES_PER_MB
+
+    # twice the channels, about half the window
+    wider = MemoryGovernor(64, 512, CHUNK_SIZE * 512, CHUNK_SIZE, buffer_bytes_per_sample=2 * buffer_bytes_per_sample)
+    assert wider.chunk_size < constrained.chunk_size
+
+    # memory already in use is not available to the window
+    rss['mb'] = 32
+    assert MemoryGovernor(64, 256, CHUNK_SIZE * 256, CHUNK_SIZE, buffer_bytes_per_sample=buffer_bytes_per_sample).chunk_size < constrained.chunk_size
+
+    # a fixed window is kept regardless
+    assert MemoryGovernor(64, 256, CHUNK_SIZE * 256, CHUNK_SIZE, buffer_bytes_per_sample=buffer_bytes_per_sample, shrink=False).chunk_size == CHUNK_SIZE
+
+def acquire_in_thread(memory_governor):
+    acquired = threading.Event()
+    thread = threading.Thread(target=lambda: (memory_governor.acquire(), acquired.set()), daemon=True)
+    thread.start()
+    return acquired
+
+def test_acquire_blocks_while_the_queue_is_full(rss):
+    memory_governor = MemoryGovernor(0, 1, CHUNK_SIZE, CHUNK_SIZE)
+    for _ in range(memory_governor.queue_depth):
+        memory_governor.acquire()
+
+    acquired = acquire_in_thread(memory_governor)
+    assert not acquired.wait(0.2)
+
+    memory_governor.release()
+    assert acquired.wait(2)
+
+def test_acquire_blocks_while_memory_is_above_the_high_watermark(rss):
+    memory_governor = MemoryGovernor(64, 1, CHUNK_SIZE, CHUNK_SIZE)
+    assert memory_governor.queue_depth > 1
+
+    memory_governor.acquire()
+
+    # throttled while chunks are in flight to free memory
+    rss['mb'] = 63
+    acquired = acquire_in_thread(memory_governor)
+    assert not acquired.wait(0.2)
+
+    rss['mb'] = 16
+    assert acquired.wait(2)
+
+    # never blocked without chunks in flight, which could never free memory
+    memory_governor.release()
+    memory_governor.release()
+    rss['mb'] = 63
+    assert acquire_in_thread(memory_governor).wait(2)
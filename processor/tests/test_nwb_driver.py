@@ -0,0 +1,69 @@
+import os
+
+from datetime import datetime, timezone
+
+import numpy as np
+
+from pynwb import NWBHDF5IO, NWBFile
+from pynwb.ecephys import LFP, ElectricalSeries
+
+from constants import TIME_SERIES_CHANNEL_TABLE_FILE_NAME
+from nwb_driver import NWBFileDriver
+from timeseries_channel import ChannelTable
+from writer import TimeSeriesChunkWriter
+
+from conftest import CHUNK_SIZE, channel_samples
+
+def write_nwb(file_path):
+    """
+    Writes a NWB file of a raw acquisition (4 channels of 1000Hz) and its LFP (2 channels of 250Hz),
+    returning the samples of each series
+    """
+    rng = np.random.default_rng(0)
+    nwbfile = NWBFile(session_description='session', identifier='nwb', session_start_time=datetime(2026, 10, 19, tzinfo=timezone.utc))
+
+    device = nwbfile.create_device(name='probe')
+    group = nwbfile.create_electrode_group(name='shank', description='shank', location='brain', device=device)
+    for _ in range(6):
+        nwbfile.add_electrode(group=group, location='brain')
+
+    raw = rng.normal(size=(5000, 4))
+    nwbfile.add_acquisition(ElectricalSeries(
+        name='ElectricalSeries',
+        data=raw,
+        electrodes=nwbfile.create_electrode_table_region(list(range(4)), 'raw electrodes'),
+        rate=1000.0,
+    ))
+
+    lfp = rng.normal(size=(1250, 2))
+    ecephys = nwbfile.create_processing_module(name='ecephys', description='ecephys')
+    ecephys.add(LFP()).create_electrical_series(
+        name='ElectricalSeries',
+        data=lfp,
+        electrodes=nwbfile.create_electrode_table_region([4, 5], 'lfp electrodes'),
+        rate=250.0,
+    )
+
+    with NWBHDF5IO(file_path, 'w') as io:
+        io.write(nwbfile)
+
+    return {'acquisition/ElectricalSeries': raw, 'processing/ecephys/LFP/ElectricalSeries': lfp}
+
+def test_series_channels_are_offset_by_the_series_before_them(tmp_path):
+    file_path = str(tmp_path / 'recording.nwb')
+    output_dir = str(tmp_path / 'output')
+    series = write_nwb(file_path)
+
+    NWBFileDriver(file_path, output_dir).write(lambda session_start_time, series_dir: TimeSeriesChunkWriter(session_start_time, series_dir, CHUNK_SIZE))
+
+    channel_offset = 0
+    for path, data in series.items():
+        series_dir = os.path.join(output_dir, NWBFileDriver.series_dir_name(path))
+        table = ChannelTable.read(os.path.join(series_dir, TIME_SERIES_CHANNEL_TABLE_FILE_NAME))
+
+        indices = list(range(channel_offset, channel_offset + data.shape[1]))
+        assert table.index.tolist() == indices
+        for column, index in enumerate(indices):
+            np.testing.assert_array_equal(channel_samples(series_dir, index), data[:, column])
+
+        channel_offset += data.shape[1]
@@ -0,0 +1,51 @@
+import gzip
+import json
+import os
+
+import numpy as np
+import pytest
+
+from overview import OverviewPyramid
+from timeseries_channel import TimeSeriesChannel
+
+FACTORS = [4, 12, 48]
+
+def expected_envelope(samples, factor, first_sample):
+    """
+    Reduces the samples into (min, max) points of blocks aligned to multiples of factor from the recording's first sample
+    """
+    blocks = (first_sample + np.arange(len(samples))) // factor
+    starts = np.flatnonzero(np.concatenate(([True], blocks[1:] != blocks[:-1])))
+    return np.column_stack((np.fmin.reduceat(samples, starts), np.fmax.reduceat(samples, starts)))
+
+@pytest.mark.parametrize('first_sample', [0, 7])
+def test_levels_match_block_reduction_of_the_samples(tmp_path, first_sample):
+    rng = np.random.default_rng(0)
+    samples = rng.normal(size=1000)
+    samples[100:110] = np.nan # NaN samples within a block are ignored
+    samples[144:192] = np.nan # a block of only NaN samples is NaN
+
+    channel = TimeSeriesChannel(index=3, name='channel', rate=100.0, start=0, end=0)
+    pyramid = OverviewPyramid(str(tmp_path), FACTORS, flush_size=5)
+
+    pyramid.start_segment(channel, 1.0, 10.99, first_sample, len(samples))
+    # chunks of irregular size, so blocks span chunks and the pending points are flushed several times
+    for start, end in zip([0, 13, 250, 251, 700], [13, 250, 251, 700, 1000]):
+        pyramid.update(channel, samples[start:end])
+    pyramid.write_metadata(channel)
+
+    with open(tmp_path / 'channel-00003.overview.json') as file:
+        metadata = json.load(file)
+
+    assert [level['rate'] for level in metadata['levels']] == [100.0 / factor for factor in FACTORS]
+
+    segment, = metadata['segments']
+    assert (segment['start'], segment['end'], segment['first_sample'], segment['num_samples']) == (1000000, 10990000, first_sample, 1000)
+
+    for level, factor in zip(segment['levels'], FACTORS):
+        with gzip.open(os.path.join(tmp_path, level['file']), 'rb') as f:
+            points = np.frombuffer(f.read(), dtype='>f8').reshape(-1, 2)
+
+        expected = expected_envelope(samples, factor, first_sample)
+        assert level['count'] == len(expected)
+        np.testing.assert_array_equal(points, expected)
@@ -0,0 +1,34 @@
+import gzip
+import os
+
+import pytest
+
+import main
+from config import Config
+
+from conftest import CHUNK_SIZE
+
+@pytest.mark.parametrize('output_format, overview_factors, stats_enabled', [('float64', [10, 100], True), ('int24', [], False)])
+def test_probe_describes_the_conversion_output(bdf_recording, tmp_path, output_format, overview_factors, stats_enabled):
+    config = Config()
+    config.OUTPUT_DIR = str(tmp_path / 'output')
+    config.OUTPUT_FORMAT = output_format
+    config.OVERVIEW_FACTORS = overview_factors
+    config.STATS_ENABLED = stats_enabled
+    os.makedirs(config.OUTPUT_DIR)
+
+    probed = main.probe(bdf_recording, config, CHUNK_SIZE)
+    main.convert(bdf_recording, config, CHUNK_SIZE)
+
+    output_files = os.listdir(config.OUTPUT_DIR)
+    chunk_files = [name for name in output_files if name.endswith('.bin.gz') or name.endswith('.ibin.gz')]
+
+    assert probed['chunk_files'] == len(chunk_files)
+    assert probed['output_files'] == len(output_files)
+    assert sum(channel['chunks'] for channel in probed['channels']) == len(chunk_files)
+
+    output_bytes = 0
+    for name in chunk_files:
+        with gzip.open(os.path.join(config.OUTPUT_DIR, name), 'rb') as f:
+            output_bytes += len(f.read())
+    assert probed['output_bytes'] == output_bytes
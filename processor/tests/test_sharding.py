@@ -0,0 +1,60 @@
+import glob
+import json
+import os
+
+import numpy as np
+
+from bdf_header import BDFHeader
+from config import Config
+from constants import TIME_SERIES_CHANNEL_TABLE_FILE_NAME
+from sharding import merge_shards, plan_shards
+from stats import ChunkStatsIndex
+
+from conftest import CHUNK_SIZE, chunk_files, read_chunk
+
+def test_merge_shards_equals_unsharded_conversion(bdf_recording, tmp_path):
+    import main
+
+    config = Config()
+    # factors not dividing the shards' first samples, so the shards split overview blocks
+    config.OVERVIEW_FACTORS = [3, 9, 27]
+
+    config.OUTPUT_DIR = str(tmp_path / 'whole')
+    os.makedirs(config.OUTPUT_DIR)
+    main.convert(bdf_recording, config, CHUNK_SIZE)
+
+    config.OUTPUT_DIR = str(tmp_path / 'sharded')
+    os.makedirs(config.OUTPUT_DIR)
+    shards = plan_shards(BDFHeader.read(bdf_recording), 2, 3, CHUNK_SIZE)
+    assert len(shards) == 6
+    for shard in shards:
+        main.convert(bdf_recording, config, CHUNK_SIZE, shard)
+    merge_shards(config.OUTPUT_DIR, shards)
+
+    whole_dir, sharded_dir = str(tmp_path / 'whole'), config.OUTPUT_DIR
+
+    names = chunk_files(whole_dir)
+    assert chunk_files(sharded_dir) == names
+    assert all(read_chunk(os.path.join(whole_dir, name)) == read_chunk(os.path.join(sharded_dir, name)) for name in names)
+
+    with open(os.path.join(whole_dir, TIME_SERIES_CHANNEL_TABLE_FILE_NAME)) as whole, open(os.path.join(sharded_dir, TIME_SERIES_CHANNEL_TABLE_FILE_NAME)) as sharded:
+        assert json.load(whole) == json.load(sharded)
+
+    whole_stats = ChunkStatsIndex.load(os.path.join(whole_dir, 'chunk-stats.index.npz'))
+    sharded_stats = ChunkStatsIndex.load(os.path.join(sharded_dir, 'chunk-stats.index.npz'))
+    whole_order = np.lexsort((whole_stats['start'], whole_stats['channel']))
+    sharded_order = np.lexsort((sharded_stats['start'], sharded_stats['channel']))
+    for column in whole_stats:
+        np.testing.assert_array_equal(whole_stats[column][whole_order], sharded_stats[column][sharded_order])
+
+    # a single overview segment per channel, as if the file was not sharded
+    overviews = sorted(os.path.basename(file_path) for file_path in glob.glob(os.path.join(whole_dir, '*.overview.*')))
+    assert sorted(os.path.basename(file_path) for file_path in glob.glob(os.path.join(sharded_dir, '*.overview.*'))) == overviews
+    for name in overviews:
+        if name.endswith('.json'):
+            with open(os.path.join(whole_dir, name)) as whole, open(os.path.join(sharded_dir, name)) as sharded:
+                assert json.load(whole) == json.load(sharded)
+        else:
+            assert read_chunk(os.path.join(whole_dir, name)) == read_chunk(os.path.join(sharded_dir, name))
+
+    assert not glob.glob(os.path.join(sharded_dir, 'shard-*'))
@@ -0,0 +1,85 @@
+import gzip
+import os
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import numpy as np
+
+from sink import BYTES_PER_MB, UploadChunkSink
+
+CHUNK_BYTES = BYTES_PER_MB // 4
+
+class FakeImport:
+    """
+    Records the uploaded chunks in place of a TimeSeriesImport, failing the first upload of the given files
+    """
+    def __init__(self, output_dir, file_names, failing=()):
+        self.import_id = 'import'
+        self.files = {file_name: SimpleNamespace(local_path=os.path.join(output_dir, file_name)) for file_name in file_names}
+        self.failing = set(failing)
+        self.uploads = {}
+        self.concurrent = 0
+        self.max_concurrent = 0
+        self._lock = threading.Lock()
+
+    def upload(self, file_name, data=None):
+        with self._lock:
+            if file_name in self.failing:
+                self.failing.remove(file_name)
+                raise IOError(f"failed to upload {file_name}")
+            self.concurrent += 1
+            self.max_concurrent = max(self.max_concurrent, self.concurrent)
+
+        if data is None:
+            with open(self.files[file_name].local_path, 'rb') as f:
+                data = f.read()
+        time.sleep(0.02)
+
+        with self._lock:
+            self.concurrent -= 1
+            self.uploads[file_name] = gzip.decompress(data)
+
+    def upload_file(self, file_name):
+        self.upload(file_name)
+
+    @property
+    def uploaded(self):
+        return len(self.uploads)
+
+def chunks(count):
+    rng = np.random.default_rng(0)
+    # random samples hardly compress, so each chunk holds about its uncompressed size of the budget
+    return {f'channel-00000_{i}_{i + 1}.bin.gz': rng.normal(size=CHUNK_BYTES // 8) for i in range(count)}
+
+def test_chunks_in_flight_are_bounded_by_the_budget(tmp_path):
+    data = chunks(16)
+    timeseries_import = FakeImport(str(tmp_path), data)
+
+    # a budget of two and a half chunks holds two chunks at a time
+    sink = UploadChunkSink(2.5 * CHUNK_BYTES / BYTES_PER_MB)
+    sink.open(timeseries_import)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(sink.write, data.keys(), data.values()))
+    sink.close()
+
+    assert timeseries_import.max_concurrent == 2
+    assert all(timeseries_import.uploads[file_name] == chunk.tobytes() for file_name, chunk in data.items())
+
+def test_failed_upload_is_spilled_and_retried_from_disk(tmp_path):
+    data = chunks(4)
+    failing = list(data)[1]
+    timeseries_import = FakeImport(str(tmp_path), data, failing=[failing])
+
+    sink = UploadChunkSink(1)
+    sink.open(timeseries_import)
+    for file_name, chunk in data.items():
+        sink.write(file_name, chunk)
+    sink.close()
+
+    assert timeseries_import.uploads[failing] == data[failing].tobytes()
+    assert timeseries_import.uploaded == len(data)
+    # the spilled chunk is removed once uploaded, no chunk file remains on the local disk
+    assert os.listdir(tmp_path) == []
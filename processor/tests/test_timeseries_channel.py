@@ -0,0 +1,37 @@
+from timeseries_channel import ChannelTable, TimeSeriesChannel
+
+def channels(start, end):
+    return [
+        TimeSeriesChannel(index=3, name='Fp1', rate=256.0, start=start, end=end, unit='mV', group='scalp', properties=[{'key': 'value'}], id='N:channel:1'),
+        TimeSeriesChannel(index=0, name='Fp2', rate=2048.0, start=start, end=end, last_annotation=42),
+        TimeSeriesChannel(index=7, name='Unit 1', rate=30000.0, start=start, end=end, type='UNIT'),
+    ]
+
+def described(channel):
+    return (channel.index, channel.as_dict())
+
+def test_table_round_trip(tmp_path):
+    file_path = str(tmp_path / 'channels.table.json')
+    written = channels(1000000, 5000000)
+    ChannelTable.from_channels(written).write(file_path)
+
+    table = ChannelTable.read(file_path)
+    assert [described(channel) for channel in table] == [described(channel) for channel in written]
+
+    assert described(table.find(7)) == described(written[2])
+    assert table.find(1) is None
+
+def test_merge_spans_all_tables_of_a_channel():
+    first = ChannelTable.from_channels(channels(1000000, 3000000))
+    second = ChannelTable.from_channels(channels(3000000, 5000000)[:2])
+    merged = ChannelTable.merge([second, ChannelTable.from_channels([]), first])
+
+    assert merged.index.tolist() == [0, 3, 7]
+    assert merged.start.tolist() == [1000000] * 3
+    assert merged.end.tolist() == [5000000, 5000000, 3000000]
+
+    # the remaining metadata is kept
+    fp2, fp1, unit = merged
+    assert (fp2.name, fp2.rate, fp2.last_annotation) == ('Fp2', 2048.0, 42)
+    assert (fp1.name, fp1.unit, fp1.group, fp1.properties, fp1.id) == ('Fp1', 'mV', 'scalp', [{'key': 'value'}], 'N:channel:1')
+    assert (unit.name, unit.type, unit.rate) == ('Unit 1', 'UNIT', 30000.0)
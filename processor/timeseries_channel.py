@@ -1,8 +1,11 @@
-import os
-import uuid
+import json
+import numpy as np
 
 class TimeSeriesChannel:
-    def __init__(self, index, name, rate, start, end, type = 'CONTINUOUS', unit = 'uV', group='default', last_annotation=0, properties=[], id=None):
+    # fixed attributes keep the many channel objects of high channel count recordings small
+    __slots__ = ('index', 'id', 'name', 'rate', 'start', 'end', 'unit', 'type', 'group', 'last_annotation', 'properties')
+
+    def __init__(self, index, name, rate, start, end, type = 'CONTINUOUS', unit = 'uV', group='default', last_annotation=0, properties=None, id=None):
         assert type.upper() in ['CONTINUOUS', 'UNIT'], "Type must be CONTINUOUS or UNIT"
 
         # metadata for intra-processor tracking
@@ -19,7 +22,7 @@ class TimeSeriesChannel:
         self.type     = type.upper()
         self.group    = group.strip()
         self.last_annotation = last_annotation
-        self.properties = properties
+        self.properties = properties if properties is not None else []
 
     def as_dict(self):
         resp = {
@@ -63,3 +66,144 @@ class TimeSeriesChannel:
             self.type.casefold() == other.type.casefold(),
             abs(1-(self.rate/other.rate)) < 0.02
         ])
+
+class ChannelTable:
+    """
+    Array-backed table of the metadata of many channels.
+
+    The index, start, end, rate and last annotation columns are numpy arrays so computations across
+    channels (e.g. spanning the start / end of the same channel in several tables) are vectorized,
+    the remaining columns are lists. The table is serialized as a single (columnar) JSON document,
+    written and read in one go rather than a file per channel.
+
+    Attributes:
+        index (np.ndarray): intra-processor channel index of each channel
+        start (np.ndarray): start (in microseconds) of each channel
+        end (np.ndarray): end (in microseconds) of each channel
+        rate (np.ndarray): sampling rate (in Hz) of each channel
+        last_annotation (np.ndarray): last annotation of each channel
+        name, unit, type, group, properties, id (list): remaining metadata of each channel
+    """
+    ARRAY_COLUMNS = {'index': np.int64, 'start': np.int64, 'end': np.int64, 'rate': np.float64, 'last_annotation': np.int64}
+    LIST_COLUMNS = ('name', 'unit', 'type', 'group', 'properties', 'id')
+
+    def __init__(self, index, name, rate, start, end, unit, type, group, last_annotation, properties, id):
+        self.index           = np.asarray(index, dtype=np.int64)
+        self.start           = np.asarray(start, dtype=np.int64)
+        self.end             = np.asarray(end, dtype=np.int64)
+        self.rate            = np.asarray(rate, dtype=np.float64)
+        self.last_annotation = np.asarray(last_annotation, dtype=np.int64)
+
+        self.name       = list(name)
+        self.unit       = list(unit)
+        self.type       = list(type)
+        self.group      = list(group)
+        self.properties = list(properties)
+        self.id         = list(id)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        return (self.channel(position) for position in range(len(self)))
+
+    def channel(self, position):
+        """
+        Returns the channel at the given position (row) of the table
+        """
+        return TimeSeriesChannel(
+            index = int(self.index[position]),
+            name = self.name[position],
+            rate = self.rate[position].item(),
+            start = self.start[position],
+            end = self.end[position],
+            type = self.type[position],
+            unit = self.unit[position],
+            group = self.group[position],
+            last_annotation = int(self.last_annotation[position]),
+            properties = self.properties[position],
+            id = self.id[position],
+        )
+
+    def find(self, index):
+        """
+        Returns the channel with the given channel index, or None when it is not in the table
+        """
+        positions = np.flatnonzero(self.index == index)
+        return self.channel(positions[0]) if len(positions) > 0 else None
+
+    def as_dict(self):
+        table = {column: getattr(self, column).tolist() for column in self.ARRAY_COLUMNS}
+        table.update({column: getattr(self, column) for column in self.LIST_COLUMNS})
+        return table
+
+    def write(self, file_path):
+        with open(file_path, 'w') as file:
+            json.dump(self.as_dict(), file)
+
+    @staticmethod
+    def from_channels(channels):
+        channels = list(channels)
+        return ChannelTable(
+            index = [channel.index for channel in channels],
+            name = [channel.name for channel in channels],
+            rate = [channel.rate for channel in channels],
+            start = [channel.start for channel in channels],
+            end = [channel.end for channel in channels],
+            unit = [channel.unit for channel in channels],
+            type = [channel.type for channel in channels],
+            group = [channel.group for channel in channels],
+            last_annotation = [channel.last_annotation for channel in channels],
+            properties = [channel.properties for channel in channels],
+            id = [channel.id for channel in channels],
+        )
+
+    @staticmethod
+    def from_dict(table):
+        return ChannelTable(**{column: table[column] for column in (*ChannelTable.ARRAY_COLUMNS, *ChannelTable.LIST_COLUMNS)})
+
+    @staticmethod
+    def read(file_path):
+        with open(file_path, 'r') as file:
+            return ChannelTable.from_dict(json.load(file))
+
+    @staticmethod
+    def merge(tables):
+        """
+        Merges tables holding (parts of) the same channels e.g. of several shards of a file into a single table
+        ordered by channel index, each channel spanning the earliest start and the latest end of all its rows
+        """
+        tables = [table for table in tables if len(table) > 0]
+        if not tables:
+            return ChannelTable.from_channels([])
+
+        index = np.concatenate([table.index for table in tables])
+
+        order = np.argsort(index, kind='stable')
+        index = index[order]
+        # position (within the sorted rows) of the first row of each channel
+        first = np.flatnonzero(np.concatenate(([True], index[1:] != index[:-1])))
+
+        def rows(column):
+            values = [value for table in tables for value in getattr(table, column)]
+            return [values[order[position]] for position in first]
+
+        def array_rows(column):
+            return np.concatenate([getattr(table, column) for table in tables])[order][first]
+
+        start = np.concatenate([table.start for table in tables])[order]
+        end = np.concatenate([table.end for table in tables])[order]
+
+        return ChannelTable(
+            index = index[first],
+            name = rows('name'),
+            rate = array_rows('rate'),
+            start = np.minimum.reduceat(start, first),
+            end = np.maximum.reduceat(end, first),
+            unit = rows('unit'),
+            type = rows('type'),
+            group = rows('group'),
+            last_annotation = array_rows('last_annotation'),
+            properties = rows('properties'),
+            id = rows('id'),
+        )
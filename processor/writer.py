@@ -1,11 +1,20 @@
-import gzip
+import heapq
 import json
 import logging
 import numpy as np
 import os
 
-from constants import TIME_SERIES_BINARY_FILE_EXTENSION, TIME_SERIES_METADATA_FILE_EXTENSION
-from reader import NWBElectricalSeriesReader
+from concurrent.futures import ThreadPoolExecutor
+
+from constants import TIME_SERIES_BINARY_FILE_EXTENSION, TIME_SERIES_CHANNEL_TABLE_FILE_NAME
+from constants import TIME_SERIES_INTEGER_BINARY_FILE_EXTENSION, TIME_SERIES_ENCODING_FILE_EXTENSION
+from checkpoint import ConversionCheckpoint
+from encoding import ChunkEncoding
+from governor import MemoryGovernor
+from overview import OverviewPyramid
+from sink import DiskChunkSink
+from stats import ChunkStatsIndex
+from timeseries_channel import ChannelTable
 from utils import to_big_endian
 
 log = logging.getLogger()
@@ -15,57 +24,286 @@ class TimeSeriesChunkWriter:
     Attributes:
         output_dir (str): path to output directory for chunked sample data binary files
         chunk_size (int): number of samples (rounded down) to include in a single chunked sample data binary file (pre-compression)
-            each sample is represented as a 64-bit (8 byte) floating-point value
+            each sample is represented as a 64-bit (8 byte) floating-point value, BDF / EDF channels are chunked in
+            whole data records of at most chunk_size samples of the file's highest sampling rate
+        overview_factors (list[int]): decimation factors of the min/max overview levels built alongside the chunks
+            (no overviews are built when empty)
+        write_stats (bool): whether to write the per-chunk statistics index alongside the chunks
+        output_format (str): sample format of the chunked sample data binary files
+            float64 (default) or one of the compact integer formats (int32, int24) holding the reader's digital values
+        delta_encoding (bool): whether compact integer samples are delta encoded before compression
+        max_memory_mb (int): memory budget (in MB) from which the read window, queue depth and number of
+            writer workers are derived (0 for no memory limit)
+        checkpoint (bool): whether to checkpoint completed chunks and resume the chunks missing from a previous run
+        sink (DiskChunkSink | UploadChunkSink): destination of the chunk sample data, gzipped files in the output directory by default
     """
 
-    def __init__(self, session_start_time, output_dir, chunk_size):
+    def __init__(self, session_start_time, output_dir, chunk_size, overview_factors=None, write_stats=True, output_format='float64', delta_encoding=False, max_memory_mb=0, checkpoint=True, sink=None):
         self.session_start_time = session_start_time
         self.output_dir = output_dir
         self.chunk_size = chunk_size
+        self.output_format = output_format
+        self.delta_encoding = delta_encoding
+        self.max_memory_mb = max_memory_mb
+        self.checkpoint = checkpoint
+        self.sink = sink if sink is not None else DiskChunkSink(output_dir)
+
+        self.overviews = None
+        if overview_factors:
+            # flush the finest level about every ten chunks to bound the envelope points held per channel
+            self.overviews = OverviewPyramid(output_dir, overview_factors, max(1, chunk_size // min(overview_factors)))
 
-    def write_electrical_series(self, reader):
+        self.stats = ChunkStatsIndex(output_dir) if write_stats else None
+
+    def write_electrical_series(self, reader, governor=None):
         """
         Chunks the sample data in two stages:
             1. Splits sample data into contiguous segments using the given or generated timestamp values
             2. Chunks each contiguous segment into the given chunk_size (number of samples to include per file)
 
-        Writes each chunk to the given output directory
+        Writes each chunk to the writer's sink, along with the overviews, statistics and encodings
+        reduced from the same in-memory chunks
+
+        The given governor (see memory_governor) fixes the chunk size, otherwise it is fitted to the memory budget
         """
+        groups = self.rate_groups(reader)
+
+        # a given governor (e.g. shared by the series of a file, or of a shard) keeps its chunk size and budget
+        fixed_governor = governor is not None
+        if governor is None:
+            governor = self.memory_governor(reader)
+        chunk_size = governor.chunk_size
+
+        checkpoint = None
+        if self.checkpoint:
+            checkpoint = ConversionCheckpoint(self.output_dir, self.fingerprint(reader))
+            resumed_chunk_size = checkpoint.open(chunk_size)
+
+            if resumed_chunk_size != chunk_size:
+                # the windows must line up with the previous run's, which is only resumed when its window fits the memory budget
+                # (and the chunk size is not fixed)
+                resumed_governor = self.memory_governor(reader, chunk_size=resumed_chunk_size) if not fixed_governor else None
+                if resumed_governor is not None and resumed_governor.chunk_size == resumed_chunk_size:
+                    governor = resumed_governor
+                    chunk_size = resumed_chunk_size
+                else:
+                    log.info(f"discarding checkpoint with chunk size {resumed_chunk_size}, the conversion's chunk size is {chunk_size}")
+                    checkpoint.restart(chunk_size)
+
+        encodings = None
+        if self.output_format != 'float64':
+            assert all(hasattr(group, 'get_digital_chunk') for group in groups), f"Reader does not support the {self.output_format} output format"
+            encodings = {
+                channel.index: ChunkEncoding.from_scale_info(group.scale_info[channel_index], self.output_format, self.delta_encoding)
+                for group in groups
+                for channel_index, channel in enumerate(group.channels)
+            }
+
+        failures = []
+
+        def on_chunk_written(future):
+            governor.release()
+            if future.exception() is not None:
+                failures.append(future.exception())
+
+        try:
+            with ThreadPoolExecutor(max_workers=governor.workers) as executor:
+                for group, contiguous_start, contiguous_end, chunk_start, chunk_end in self.windows(groups, chunk_size):
+                    if self.overviews is not None and chunk_start == contiguous_start:
+                        # sample index within the whole recording, for a group covering only part of it (e.g. a shard)
+                        first_sample = getattr(group, 'first_sample', 0) + contiguous_start
+                        for channel in group.channels:
+                            self.overviews.start_segment(channel, group.timestamps[contiguous_start], group.timestamps[contiguous_end - 1], first_sample, contiguous_end - contiguous_start)
+
+                    start_time = group.timestamps[chunk_start]
+                    end_time = group.timestamps[chunk_end - 1]
+
+                    for channel_index, channel in enumerate(group.channels):
+                        completed = checkpoint.completed(channel, start_time, end_time) if checkpoint is not None else None
+                        if completed is not None:
+                            if self.stats is not None:
+                                self.stats.add_statistics(channel, start_time, end_time, chunk_end - chunk_start, completed['statistics'])
+
+                            # the chunk is only read again when it is needed to build the overviews
+                            if self.overviews is not None:
+                                self.overviews.update(channel, group.get_chunk(channel_index, chunk_start, chunk_end))
+                            continue
 
-        for contiguous_start, contiguous_end in reader.contiguous_chunks():
-            for chunk_start in range(contiguous_start, contiguous_end, self.chunk_size):
-                chunk_end = min(contiguous_end, chunk_start + self.chunk_size)
+                        governor.acquire()
+                        if failures:
+                            governor.release()
+                            raise failures[0]
 
-                start_time = reader.timestamps[chunk_start]
-                end_time = reader.timestamps[chunk_end - 1]
+                        encoding = encodings[channel.index] if encodings is not None else None
+                        if encoding is None:
+                            data = chunk = group.get_chunk(channel_index, chunk_start, chunk_end)
+                        else:
+                            data = group.get_digital_chunk(channel_index, chunk_start, chunk_end)
+                            chunk = encoding.to_physical(data)
 
-                for channel_index in range(len(reader.channels)):
-                    chunk = reader.get_chunk(channel_index, chunk_start, chunk_end)
-                    channel = reader.channels[channel_index]
-                    self.write_chunk(chunk, start_time, end_time, channel)
+                        statistics = ()
+                        if self.stats is not None:
+                            statistics = self.stats.add(channel, start_time, end_time, chunk)
+
+                        future = executor.submit(self._write_checkpointed_chunk, data, start_time, end_time, channel, encoding, checkpoint, statistics)
+                        future.add_done_callback(on_chunk_written)
+
+                        if self.overviews is not None:
+                            self.overviews.update(channel, chunk)
+
+                    # none of the group's samples before this window will be requested again
+                    if hasattr(group, 'release'):
+                        group.release(chunk_end)
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()
+
+        if failures:
+            raise failures[0]
+
+        self.write_channels(reader.channels)
 
         for channel in reader.channels:
-            self.write_channel(channel)
+            if encodings is not None:
+                self.write_encoding(channel, encodings[channel.index])
+
+            if self.overviews is not None:
+                self.overviews.write_metadata(channel)
+
+        if self.stats is not None:
+            self.stats.write()
 
-    def write_chunk(self, chunk, start_time, end_time, channel):
+    def memory_governor(self, *readers, chunk_size=None, shrink=True):
         """
-        Formats the chunked sample data into 64-bit (8 byte) values in big-endian.
+        Returns the memory governor bounding the conversion of the readers' sample data, which determines the chunk size
+        (at most the writer's chunk size, or the given chunk size e.g. of a resumed run, exactly that chunk size unless shrink)
 
-        Writes the chunked sample data to a gzipped binary file.
+        Several readers written concurrently (by writers of the same configuration) share a single governor, and with it the memory budget
         """
-        # ensure the samples are 64-bit float-pointing numbers in big-endian before converting to bytes
-        formatted_data = to_big_endian(chunk.astype(np.float64)) 
+        groups = [group for reader in readers for group in self.rate_groups(reader)]
+        num_channels = sum(len(reader.channels) for reader in readers)
+        num_samples = sum(group.num_samples for group in groups)
 
+        resident_bytes = self.sink.resident_bytes
+        if self.overviews is not None:
+            resident_bytes += self.overviews.resident_bytes(num_channels)
+
+        # timestamps computed on access (e.g. of uniformly sampled BDF data) hold no memory, arrays (e.g. of NWB series) do
+        timestamp_bytes = sum(getattr(group.timestamps, 'nbytes', 0) for group in groups)
+
+        # readers decoding their data (e.g. BDF data records) hold about a window of every channel
+        buffer_bytes_per_sample = sum(getattr(reader, 'buffer_bytes_per_sample', 0) for reader in readers)
+
+        return MemoryGovernor(
+            self.max_memory_mb,
+            num_channels,
+            num_samples,
+            chunk_size if chunk_size is not None else self.chunk_size,
+            resident_bytes=resident_bytes,
+            timestamp_bytes=timestamp_bytes,
+            buffer_bytes_per_sample=buffer_bytes_per_sample,
+            shrink=shrink
+        )
+
+    def chunk_file_names(self, reader, chunk_size):
+        """
+        Returns the names of all chunk files the conversion of the reader's sample data into chunks of chunk_size samples
+        will write, without reading any sample data
+        """
+        extension = TIME_SERIES_BINARY_FILE_EXTENSION if self.output_format == 'float64' else TIME_SERIES_INTEGER_BINARY_FILE_EXTENSION
+
+        return [
+            self.chunk_file_name(channel, group.timestamps[chunk_start], group.timestamps[chunk_end - 1], extension)
+            for group, _, _, chunk_start, chunk_end in self.windows(self.rate_groups(reader), chunk_size)
+            for channel in group.channels
+        ]
+
+    @staticmethod
+    def chunk_file_name(channel, start_time, end_time, extension=TIME_SERIES_BINARY_FILE_EXTENSION):
         channel_index = '{index:05d}'.format(index=channel.index)
-        file_name = "channel-{}_{}_{}{}".format(channel_index, int(start_time * 1e6), int(end_time * 1e6), TIME_SERIES_BINARY_FILE_EXTENSION)
-        file_path = os.path.join(self.output_dir, file_name)
+        return "channel-{}_{}_{}{}".format(channel_index, int(start_time * 1e6), int(end_time * 1e6), extension)
+
+    @staticmethod
+    def rate_groups(reader):
+        """
+        Returns the groups of channels sharing a sampling rate and timestamps,
+        a reader without rate groups forms a single group
+        """
+        return getattr(reader, 'rate_groups', [reader])
+
+    @staticmethod
+    def windows(groups, chunk_size):
+        """
+        Returns a generator of the chunk windows (group, contiguous_start, contiguous_end, chunk_start, chunk_end)
+        of all rate groups, ordered by the end time of the window.
+
+        Each contiguous segment of a group is chunked into chunk_size samples, or the group's own window size when it has one
+        (e.g. whole data records of BDF / EDF channels), ordering the windows of all groups by time
+        lets a reader decode its data in a single forward pass while buffering about a single window per group.
+        """
+        def group_windows(group_index, group):
+            window_size = group.window_size(chunk_size) if hasattr(group, 'window_size') else chunk_size
+            for contiguous_start, contiguous_end in group.contiguous_chunks():
+                for chunk_start in range(contiguous_start, contiguous_end, window_size):
+                    chunk_end = min(contiguous_end, chunk_start + window_size)
+                    yield group.timestamps[chunk_end - 1], group_index, (group, contiguous_start, contiguous_end, chunk_start, chunk_end)
+
+        for _, _, window in heapq.merge(*(group_windows(group_index, group) for group_index, group in enumerate(groups))):
+            yield window
+
+    def fingerprint(self, reader):
+        """
+        Identifies the conversion of the reader's sample data into this writer's output format
+        """
+        groups = self.rate_groups(reader)
+
+        return {
+            'start':          min(int(group.timestamps[0] * 1e6) for group in groups),
+            'end':            max(int(group.timestamps[-1] * 1e6) for group in groups),
+            'num_samples':    [int(group.num_samples) for group in groups],
+            'channels':       [channel.name for channel in reader.channels],
+            'output_format':  self.output_format,
+            'delta_encoding': self.delta_encoding,
+            'statistics':     self.stats is not None,
+        }
+
+    def _write_checkpointed_chunk(self, chunk, start_time, end_time, channel, encoding, checkpoint, statistics):
+        file_name, size = self.write_chunk(chunk, start_time, end_time, channel, encoding)
+
+        if checkpoint is not None:
+            checkpoint.record(channel, start_time, end_time, file_name, size, statistics)
+
+    def write_chunk(self, chunk, start_time, end_time, channel, encoding=None):
+        """
+        Formats the chunked sample data into 64-bit (8 byte) values in big-endian,
+        or when an encoding is given, the chunked digital sample data into compact integer values.
+
+        Writes the chunked sample data to the writer's sink, by default a gzipped binary file in the output directory.
 
-        with gzip.open(file_path, 'wb') as f:
-            f.write(formatted_data)
+        Returns the chunk's file name and uncompressed size (in bytes)
+        """
+        if encoding is None:
+            # ensure the samples are 64-bit float-pointing numbers in big-endian before converting to bytes
+            formatted_data = to_big_endian(chunk.astype(np.float64))
+            extension = TIME_SERIES_BINARY_FILE_EXTENSION
+        else:
+            formatted_data = encoding.encode(chunk)
+            extension = TIME_SERIES_INTEGER_BINARY_FILE_EXTENSION
+
+        file_name = self.chunk_file_name(channel, start_time, end_time, extension)
+        self.sink.write(file_name, formatted_data)
+
+        return file_name, memoryview(formatted_data).nbytes
+
+    def write_channels(self, channels):
+        """
+        Writes the metadata of all channels as a single channel table
+        """
+        ChannelTable.from_channels(channels).write(os.path.join(self.output_dir, TIME_SERIES_CHANNEL_TABLE_FILE_NAME))
 
-    def write_channel(self, channel):
-        file_name = f'channel-{channel.index:05d}{TIME_SERIES_METADATA_FILE_EXTENSION}'
+    def write_encoding(self, channel, encoding):
+        file_name = f'channel-{channel.index:05d}{TIME_SERIES_ENCODING_FILE_EXTENSION}'
         file_path = os.path.join(self.output_dir, file_name)
 
         with open(file_path, 'w') as file:
-            json.dump(channel.as_dict(), file)
+            json.dump(encoding.as_dict(), file)